@@ -0,0 +1,296 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import parse_qs, urlparse
+
+CATEGORIES = ["veterinaria", "farmacia", "panaderia", "ferreteria", "kiosco"]
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+
+
+def _boundary(model_name: str) -> np.ndarray:
+    # (lon, lat) vertices, same order as the gmsh geometry
+    coordinates = np.loadtxt(
+        f"map_coordinates/boundaries/{model_name}.txt", delimiter=","
+    )
+    return coordinates[:, ::-1]
+
+
+def _inside(polygon: np.ndarray, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    # even-odd ray casting, vectorized over the points
+    inside = np.zeros(len(lon), dtype=bool)
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    for ax, ay, bx, by in zip(x1, y1, x2, y2):
+        crosses = (ay > lat) != (by > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = ax + (lat - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (lon < x_cross)
+    return inside
+
+
+class PlacesDataset:
+    """
+    Seeded synthetic businesses placed over a region boundary, most of them
+    clustered around the densest area so some searches hit the results cap
+    Attributes: \n
+        `lat:` np.ndarray \n
+        `lon:` np.ndarray \n
+        `category:` np.ndarray, index in CATEGORIES \n
+    """
+
+    def __init__(
+        self,
+        model_name: str = "buenos_aires",
+        businesses: int = 20_000,
+        seed: int = 42,
+        cluster_center=(-34.61, -58.45),
+        cluster_share: float = 0.6,
+    ):
+        rng = np.random.default_rng(seed)
+        polygon = _boundary(model_name)
+        lon_min, lat_min = polygon.min(axis=0)
+        lon_max, lat_max = polygon.max(axis=0)
+
+        lat, lon = [], []
+        count = 0
+        while count < businesses:
+            size = 2 * businesses
+            clustered = rng.random(size) < cluster_share
+            sample_lat = np.where(
+                clustered,
+                rng.normal(cluster_center[0], 0.25, size),
+                rng.uniform(lat_min, lat_max, size),
+            )
+            sample_lon = np.where(
+                clustered,
+                rng.normal(cluster_center[1], 0.25, size),
+                rng.uniform(lon_min, lon_max, size),
+            )
+            keep = _inside(polygon, sample_lon, sample_lat)
+            lat.append(sample_lat[keep])
+            lon.append(sample_lon[keep])
+            count += int(keep.sum())
+
+        self.lat = np.concatenate(lat)[:businesses]
+        self.lon = np.concatenate(lon)[:businesses]
+        self.category = rng.integers(0, len(CATEGORIES), businesses)
+        self.prominence = rng.random(businesses)
+
+    def nearby(self, lat: float, lon: float, radius: float, keyword: str) -> np.ndarray:
+        """
+        :return: indexes of the matching businesses, most prominent first
+        """
+        lat_1, lon_1 = np.radians(lat), np.radians(lon)
+        lat_2, lon_2 = np.radians(self.lat), np.radians(self.lon)
+        a = (
+            np.sin((lat_2 - lat_1) / 2) ** 2
+            + np.cos(lat_1) * np.cos(lat_2) * np.sin((lon_2 - lon_1) / 2) ** 2
+        )
+        distance = 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+        match = distance <= radius
+        if keyword in CATEGORIES:
+            match &= self.category == CATEGORIES.index(keyword)
+        indexes = np.flatnonzero(match)
+        return indexes[np.argsort(-self.prominence[indexes])][:MAX_RESULTS]
+
+    def place(self, index: int) -> dict:
+        return {
+            "place_id": f"mock{index:08d}",
+            "name": f"{CATEGORIES[self.category[index]].title()} {index}",
+            "vicinity": f"Calle {index % 300} {index % 5000}",
+            "geometry": {
+                "location": {
+                    "lat": float(self.lat[index]),
+                    "lng": float(self.lon[index]),
+                }
+            },
+            "types": [CATEGORIES[self.category[index]], "establishment"],
+            "business_status": "OPERATIONAL",
+        }
+
+    def details(self, index: int) -> dict:
+        return {
+            "formatted_phone_number": f"0221 {index % 10000:04d}-{index % 997:03d}",
+            "website": f"https://example.com/{index}",
+            "url": f"https://maps.google.com/?cid={index}",
+            "address_components": [
+                {
+                    "long_name": str(index % 5000),
+                    "short_name": str(index % 5000),
+                    "types": ["street_number"],
+                },
+                {
+                    "long_name": f"Calle {index % 300}",
+                    "short_name": f"C. {index % 300}",
+                    "types": ["route"],
+                },
+                {
+                    "long_name": f"Barrio {index % 40}",
+                    "short_name": f"B{index % 40}",
+                    "types": ["sublocality", "political"],
+                },
+                {
+                    "long_name": f"Localidad {index % 120}",
+                    "short_name": f"L{index % 120}",
+                    "types": ["locality", "political"],
+                },
+                {
+                    "long_name": f"B{1000 + index % 900}",
+                    "short_name": f"B{1000 + index % 900}",
+                    "types": ["postal_code"],
+                },
+            ],
+        }
+
+
+class MockPlacesServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the nearbysearch/json and details/json endpoints
+    Attributes: \n
+        `dataset:` PlacesDataset \n
+        `latency:` float, seconds added to every answer \n
+        `error_rate:` float, share of answers replaced by HTTP 500 or OVER_QUERY_LIMIT \n
+        `token_delay:` float, seconds before a next_page_token becomes valid \n
+        `requests_count:` dict, answers per endpoint
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        dataset: PlacesDataset,
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        token_delay: float = 0.0,
+        seed: int = 42,
+    ):
+        super().__init__(address, _Handler)
+        self.dataset = dataset
+        self.latency = latency
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.requests_count = {"nearbysearch": 0, "details": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._tokens = {}
+        self._token_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def nearby_page(self, query: dict) -> dict:
+        if "pagetoken" in query:
+            with self._lock:
+                entry = self._tokens.get(query["pagetoken"])
+            if entry is None or time.monotonic() < entry[0]:
+                return {"status": "INVALID_REQUEST", "results": []}
+            indexes = entry[1]
+        else:
+            lat, lon = map(float, query["location"].split(","))
+            indexes = self.dataset.nearby(
+                lat, lon, float(query["radius"]), query.get("keyword", "")
+            )
+        return self._page(indexes)
+
+    def _page(self, indexes: List[int]) -> dict:
+        page = {
+            "status": "OK" if len(indexes) else "ZERO_RESULTS",
+            "results": [self.dataset.place(int(idx)) for idx in indexes[:PAGE_SIZE]],
+        }
+        if len(indexes) > PAGE_SIZE:
+            token = f"token{next(self._token_ids)}"
+            with self._lock:
+                self._tokens[token] = (
+                    time.monotonic() + self.token_delay,
+                    indexes[PAGE_SIZE:],
+                )
+            page["next_page_token"] = token
+        return page
+
+    def failure(self):
+        """
+        :return: None, "http" (HTTP 500) or "quota" (OVER_QUERY_LIMIT)
+        """
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.requests_count["errors"] += 1
+            return "http" if self._random.random() < 0.5 else "quota"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, with Nagle on the body of every
+    # request after the first of a keep-alive connection waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(server.latency)
+
+        if url.path.endswith("/nearbysearch/json"):
+            endpoint = "nearbysearch"
+        elif url.path.endswith("/details/json"):
+            endpoint = "details"
+        else:
+            return self._send(404, {"status": "NOT_FOUND"})
+
+        failure = server.failure()
+        if failure == "http":
+            return self._send(500, {})
+        if failure == "quota":
+            return self._send(200, {"status": "OVER_QUERY_LIMIT", "results": []})
+
+        with server._lock:
+            server.requests_count[endpoint] += 1
+        if endpoint == "nearbysearch":
+            return self._send(200, server.nearby_page(query))
+
+        place_id = query.get("place_id", "")
+        index = int(place_id[4:]) if place_id[4:].isdigit() else -1
+        if not 0 <= index < len(server.dataset.lat):
+            return self._send(200, {"status": "NOT_FOUND"})
+        return self._send(
+            200, {"status": "OK", "result": server.dataset.details(index)}
+        )
+
+    def _send(self, code: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline Places API stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model-name", default="buenos_aires")
+    parser.add_argument("--businesses", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockPlacesServer(
+        ("127.0.0.1", args.port),
+        PlacesDataset(args.model_name, businesses=args.businesses, seed=args.seed),
+        latency=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        token_delay=args.token_delay,
+        seed=args.seed,
+    )
+    print(f"Mock Places API on http://127.0.0.1:{args.port}/maps/api/place", flush=True)
+    server.serve_forever()
@@ -0,0 +1,201 @@
+"""
+End-to-end throughput benchmark of the crawl against the offline mock server.
+Run from the repository root:
+
+    python -m benchmarks.run_benchmark --limit 300 --save-baseline bench_baseline.json
+    python -m benchmarks.run_benchmark --limit 300 --baseline bench_baseline.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from collections import defaultdict
+
+
+def _start_server(args) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.mock_places_server",
+            f"--port={args.port}",
+            f"--model-name={args.model_name}",
+            f"--businesses={args.businesses}",
+            f"--seed={args.seed}",
+            f"--latency-ms={args.latency_ms}",
+            f"--error-rate={args.error_rate}",
+            f"--token-delay={args.token_delay}",
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", args.port), timeout=0.2).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("mock Places server did not start")
+
+
+def run(args) -> dict:
+    # the endpoints are resolved when places_api is imported
+    os.environ["PLACES_API_BASE_URL"] = f"http://127.0.0.1:{args.port}/maps/api/place"
+    from crawler.crawl_engine import CrawlEngine
+    from crawler.details_cache import DetailsCache
+    from crawler.http_session import PlacesSession
+    from crawler.places_api import set_details_cache, set_session
+    from crawler.seen_set import make_seen_set
+    from files.save_to_file import open_sink
+    from map_coordinates.files_map_logic.mesh_cache import load_centroids
+
+    class TimedSession(PlacesSession):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.latencies = defaultdict(list)
+            self._latencies_lock = threading.Lock()
+
+        def get_json(self, url, params, retry_statuses=None):
+            start = time.perf_counter()
+            try:
+                return super().get_json(url, params, retry_statuses)
+            finally:
+                elapsed = time.perf_counter() - start
+                endpoint = url.rstrip("/").split("/")[-2]
+                with self._latencies_lock:
+                    self.latencies[endpoint].append(elapsed)
+
+    centroids = load_centroids(args.model_name)
+    locations = [[f"{lat},{lon}", radius] for lat, lon, radius in centroids.tolist()]
+    if args.limit:
+        locations = locations[: args.limit]
+
+    session = TimedSession(
+        pool_size=args.workers + args.detail_workers,
+        backoff_base=0.05,
+        page_token_delay=args.token_delay,
+    )
+    set_session(session)
+    with tempfile.TemporaryDirectory() as folder:
+        cache = None
+        if args.details_cache:
+            cache = DetailsCache(os.path.join(folder, "details_cache.sqlite"))
+        set_details_cache(cache)
+        seen = make_seen_set(args.dedup)
+        engine = CrawlEngine(
+            api_key="benchmark",
+            keyword=args.query,
+            extra_fields=[
+                "formatted_phone_number",
+                "website",
+                "url",
+                "address_component",
+            ],
+            max_workers=args.workers,
+            detail_workers=args.detail_workers,
+            seen=seen,
+            refine_max_depth=args.refine_max_depth,
+        )
+
+        start = time.perf_counter()
+        places = 0
+        output = os.path.join(folder, f"values.{args.output_format}")
+        with open_sink(args.output_format, output) as sink:
+            for _, places_found in engine.crawl(locations):
+                for place in places_found:
+                    sink.write(place)
+                    places += 1
+        wall_time = time.perf_counter() - start
+        if cache is not None:
+            cache.close()
+    session.close()
+
+    requests_number = sum(len(values) for values in session.latencies.values())
+    return {
+        "config": vars(args),
+        "centroids": len(locations),
+        "places": places,
+        "wall_time_s": wall_time,
+        "requests": {key: len(values) for key, values in session.latencies.items()},
+        "requests_per_s": requests_number / wall_time if wall_time else 0.0,
+        "latency_ms": {
+            key: {
+                "p50": float(np.percentile(values, 50) * 1000),
+                "p99": float(np.percentile(values, 99) * 1000),
+            }
+            for key, values in session.latencies.items()
+        },
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "duplicate_ratio": seen.stats()["duplicate_ratio"] if seen else 0.0,
+        "refined_cells": engine.refined_cells,
+    }
+
+
+def _compare(report: dict, baseline: dict) -> None:
+    rows = [
+        ("wall_time_s", report["wall_time_s"], baseline["wall_time_s"]),
+        ("requests_per_s", report["requests_per_s"], baseline["requests_per_s"]),
+        ("peak_rss_mb", report["peak_rss_mb"], baseline["peak_rss_mb"]),
+        ("duplicate_ratio", report["duplicate_ratio"], baseline["duplicate_ratio"]),
+    ]
+    for endpoint, latency in report["latency_ms"].items():
+        for key in ("p50", "p99"):
+            old = baseline["latency_ms"].get(endpoint, {}).get(key)
+            if old is not None:
+                rows.append((f"{endpoint}_{key}_ms", latency[key], old))
+    print(f"{'metric':<24}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, new, old in rows:
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        print(f"{name:<24}{old:>14.3f}{new:>14.3f}{change:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl throughput benchmark")
+    parser.add_argument("--model-name", default="buenos_aires")
+    parser.add_argument("--query", default="veterinaria")
+    parser.add_argument("--limit", type=int, default=0, help="centroids, 0 = all")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--detail-workers", type=int, default=16)
+    parser.add_argument("--dedup", default="exact", choices=["exact", "bloom"])
+    parser.add_argument("--details-cache", action="store_true")
+    parser.add_argument("--refine-max-depth", type=int, default=0)
+    parser.add_argument("--output-format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--businesses", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--save-baseline", help="store this report as baseline")
+    args = parser.parse_args()
+
+    server = _start_server(args)
+    try:
+        report = run(args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                file.write(output)
+    if args.baseline:
+        with open(args.baseline) as file:
+            _compare(report, json.load(file))
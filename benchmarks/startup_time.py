@@ -0,0 +1,76 @@
+"""
+Startup time of every cli.py subcommand: interpreter start and the imports done
+before the arguments are parsed, plus the heavy libraries already loaded by then.
+Run from the repository root:
+
+    python -m benchmarks.startup_time --repeat 10
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+SUBCOMMANDS = ("crawl", "estimate", "grid", "jobs")
+# libraries worth avoiding in a short cron run that does not use them
+HEAVY_MODULES = ("gmsh", "matplotlib", "pyarrow", "requests", "numpy")
+
+
+def _import_report(stderr: str):
+    """
+    Total import time in ms and the heavy modules of a `python -X importtime` log
+    """
+    total_us = 0
+    loaded = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        if not name.startswith("  "):
+            # top level import, its cumulative time includes the nested ones
+            total_us += int(cumulative)
+        module = name.strip().split(".")[0]
+        if module in HEAVY_MODULES:
+            loaded.add(module)
+    return total_us / 1000, sorted(loaded)
+
+
+def measure(subcommand: str, repeat: int) -> dict:
+    walls = []
+    imports = []
+    loaded = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "cli.py", subcommand, "--help"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        walls.append((time.perf_counter() - start) * 1000)
+        if result.returncode:
+            raise RuntimeError(f"cli.py {subcommand} failed:\n{result.stderr[-2000:]}")
+        import_ms, loaded = _import_report(result.stderr)
+        imports.append(import_ms)
+    return {
+        "wall_ms": statistics.median(walls),
+        "imports_ms": statistics.median(imports),
+        "heavy_modules": loaded,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per subcommand")
+    args = parser.parse_args()
+
+    print(f"{'subcommand':<10} {'wall ms':>8} {'imports ms':>11}  heavy modules")
+    for name in SUBCOMMANDS:
+        report = measure(name, args.repeat)
+        print(
+            f"{name:<10} {report['wall_ms']:>8.1f} {report['imports_ms']:>11.1f}  "
+            f"{', '.join(report['heavy_modules']) or '-'}"
+        )
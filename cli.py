@@ -0,0 +1,59 @@
+"""
+Single entry point of the project, run from the root folder:
+
+    python cli.py crawl [--resume | --incremental | --shards N ...]
+    python cli.py estimate [KEYWORD ...]
+    python cli.py grid [--batch [REGION ...]]
+    python cli.py jobs jobs.example.json [--resume]
+
+Each subcommand runs its script with the configuration block of that script and
+imports only what it needs: a crawl does not load gmsh nor matplotlib, an
+estimate does not load the HTTP stack.
+"""
+
+import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# subcommand -> (script, arguments put before the user ones, help)
+COMMANDS = {
+    "crawl": ("main.py", [], "sweep the centroids of the region (main.py)"),
+    "estimate": (
+        "main.py",
+        ["--estimate"],
+        "dry run cost estimate and density heatmap (main.py --estimate)",
+    ),
+    "grid": (
+        os.path.join("map_coordinates", "main_grid.py"),
+        [],
+        "mesh or circle cover centroids of the search grid (main_grid.py)",
+    ),
+    "jobs": ("run_jobs.py", [], "run a manifest of sweeps (run_jobs.py)"),
+}
+
+
+def usage() -> str:
+    lines = ["usage: python cli.py {" + ",".join(COMMANDS) + "} [arguments]", ""]
+    lines += [
+        f"  {name:<10}{help_text}" for name, (_, _, help_text) in COMMANDS.items()
+    ]
+    lines += ["", "python cli.py <command> --help lists the arguments of a command"]
+    return "\n".join(lines)
+
+
+def run(command: str, arguments: list) -> None:
+    script, fixed, _ = COMMANDS[command]
+    path = os.path.join(ROOT, script)
+    # the script sees the same sys.path and argv as when it is run directly
+    sys.path.insert(0, os.path.dirname(path))
+    sys.argv = [f"cli.py {command}"] + fixed + arguments
+    runpy.run_path(path, run_name="__main__")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(usage(), file=sys.stderr if len(sys.argv) > 1 else sys.stdout)
+        sys.exit(0 if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help") else 2)
+    run(sys.argv[1], sys.argv[2:])
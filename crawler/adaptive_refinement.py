@@ -0,0 +1,26 @@
+import math
+from typing import List, Tuple
+
+# meters per degree of latitude
+METERS_PER_DEGREE = 111_320.0
+
+
+def split_cell(location: str, radius: float) -> List[Tuple[str, float]]:
+    """
+    Quadtree split of a search cell. The cell is the bounding square of the search
+    circle, each quadrant becomes a new circle through its corners, the four of them
+    cover the parent circle.
+    :param location: "lat,lon" of the cell center
+    :param radius: search radius in meters
+    :return: [location, radius] of the 4 children
+    """
+    lat, lon = map(float, location.split(","))
+    offset = radius / 2
+    dlat = offset / METERS_PER_DEGREE
+    dlon = offset / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+    child_radius = radius / math.sqrt(2)
+    return [
+        [f"{lat + sign_lat * dlat},{lon + sign_lon * dlon}", child_radius]
+        for sign_lat in (1, -1)
+        for sign_lon in (-1, 1)
+    ]
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+from files.sinks import Place
+
+# record fields filled by the Nearby Search payload, compared to decide if a known
+# place changed: an unchanged place keeps the details saved with it
+SEARCH_FIELDS = ("name", "address", "lat", "lng", "business_status")
+
+
+def cell_fingerprint(place_ids: List[str]) -> str:
+    """
+    Hash of the sorted place_ids of a cell and their count
+    """
+    digest = hashlib.sha1(str(len(place_ids)).encode())
+    for place_id in sorted(place_ids):
+        digest.update(b"\n" + place_id.encode())
+    return digest.hexdigest()
+
+
+class CellStore:
+    """
+    State of the incremental crawls of a sweep (SQLite): fingerprint and change
+    history of every centroid plus the merged snapshot of the places
+    Attributes: \n
+        `path:` str, location of the sqlite file \n
+        `min_interval:` float, seconds between checks of a cell that always changes \n
+        `max_interval:` float, seconds between checks of a cell that never changes \n
+        `checked:` int, cells checked by this run \n
+        `changed_cells:` int, cells whose fingerprint changed in this run \n
+    Methods: \n
+        `interval():` seconds until a cell is checked again \n
+        `due():` locations whose check is due \n
+        `reuse_details():` saved place of an unchanged known place \n
+        `update_cell():` saves a cell result, returns its snapshot changes \n
+        `places():` merged snapshot \n
+        `stats():`
+    """
+
+    def __init__(
+        self,
+        path: str,
+        run_info: dict,
+        min_interval: float = 7 * 24 * 3600,
+        max_interval: float = 56 * 24 * 3600,
+    ):
+        """
+        :param run_info: parameters of the sweep, must match the stored ones
+        """
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.checked = 0
+        self.changed_cells = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE IF NOT EXISTS cells ("
+            "location TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+            "count INTEGER NOT NULL, checked_at REAL NOT NULL, "
+            "checks INTEGER NOT NULL, changes INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS places ("
+            "place_id TEXT PRIMARY KEY, place TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS cell_places ("
+            "location TEXT NOT NULL, place_id TEXT NOT NULL, "
+            "PRIMARY KEY (location, place_id));"
+            "CREATE INDEX IF NOT EXISTS cell_places_place ON cell_places (place_id);"
+        )
+        row = self._connection.execute(
+            "SELECT value FROM meta WHERE key = 'run'"
+        ).fetchone()
+        if row is None:
+            self._connection.execute(
+                "INSERT INTO meta VALUES ('run', ?)", (json.dumps(run_info),)
+            )
+        elif json.loads(row[0]) != run_info:
+            raise ValueError(f"Store {path} belongs to another sweep: {row[0]}")
+        self._connection.commit()
+
+    def interval(self, checks: int, changes: int) -> float:
+        # smoothed share of the checks that found a change
+        change_rate = (changes + 1) / (checks + 2)
+        return min(self.max_interval, self.min_interval / change_rate)
+
+    def due(self, locations: list, now: Optional[float] = None) -> list:
+        """
+        :param locations: [location, radius] pairs, the input order is kept
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state = {
+                location: (checked_at, checks, changes)
+                for location, checked_at, checks, changes in self._connection.execute(
+                    "SELECT location, checked_at, checks, changes FROM cells"
+                )
+            }
+        due = []
+        for location in locations:
+            if location[0] not in state:
+                due.append(location)
+                continue
+            checked_at, checks, changes = state[location[0]]
+            if now - checked_at >= self.interval(checks, changes):
+                due.append(location)
+        return due
+
+    def reuse_details(self, place: dict) -> Optional[Place]:
+        """
+        :param place: Nearby Search result
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT place FROM places WHERE place_id = ?", (place["place_id"],)
+            ).fetchone()
+        if row is None:
+            return None
+        saved = json.loads(row[0])
+        current = Place.from_payload(place)
+        # places saved before business_status was recorded skip that field
+        if any(
+            field in saved and saved[field] != getattr(current, field)
+            for field in SEARCH_FIELDS
+        ):
+            return None
+        saved["in_region"] = current.in_region
+        return Place.from_record(saved)
+
+    def update_cell(
+        self, location: str, places: List[Place]
+    ) -> List[Tuple[str, Place]]:
+        """
+        :return: ("added" | "changed" | "removed", place) changes of the snapshot
+        """
+        place_ids = [place.place_id for place in places]
+        fingerprint = cell_fingerprint(place_ids)
+        changes = []
+        with self._lock:
+            connection = self._connection
+            cell = connection.execute(
+                "SELECT fingerprint, checks, changes FROM cells WHERE location = ?",
+                (location,),
+            ).fetchone()
+            previous = {
+                row[0]
+                for row in connection.execute(
+                    "SELECT place_id FROM cell_places WHERE location = ?", (location,)
+                )
+            }
+            for place in places:
+                record = place.as_record()
+                row = connection.execute(
+                    "SELECT place FROM places WHERE place_id = ?", (place.place_id,)
+                ).fetchone()
+                if row is None:
+                    changes.append(("added", place))
+                elif json.loads(row[0]) != record:
+                    changes.append(("changed", place))
+                else:
+                    continue
+                # upsert keeps the rowid, the snapshot order stays stable
+                connection.execute(
+                    "INSERT INTO places VALUES (?, ?) ON CONFLICT (place_id) "
+                    "DO UPDATE SET place = excluded.place",
+                    (place.place_id, json.dumps(record)),
+                )
+            connection.executemany(
+                "INSERT OR IGNORE INTO cell_places VALUES (?, ?)",
+                [(location, place_id) for place_id in place_ids],
+            )
+            for place_id in previous - set(place_ids):
+                connection.execute(
+                    "DELETE FROM cell_places WHERE location = ? AND place_id = ?",
+                    (location, place_id),
+                )
+                # a place is gone once no cell returns it anymore
+                if connection.execute(
+                    "SELECT 1 FROM cell_places WHERE place_id = ?", (place_id,)
+                ).fetchone():
+                    continue
+                row = connection.execute(
+                    "SELECT place FROM places WHERE place_id = ?", (place_id,)
+                ).fetchone()
+                connection.execute("DELETE FROM places WHERE place_id = ?", (place_id,))
+                if row is not None:
+                    changes.append(("removed", Place.from_record(json.loads(row[0]))))
+
+            checks, changed = (0, 0) if cell is None else (cell[1], cell[2])
+            is_changed = cell is not None and cell[0] != fingerprint
+            connection.execute(
+                "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    location,
+                    fingerprint,
+                    len(place_ids),
+                    time.time(),
+                    checks + 1,
+                    changed + is_changed,
+                ),
+            )
+            connection.commit()
+            self.checked += 1
+            self.changed_cells += is_changed
+        return changes
+
+    def places(self) -> Iterator[Place]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT place FROM places ORDER BY rowid"
+            ).fetchall()
+        for row in rows:
+            yield Place.from_record(json.loads(row[0]))
+
+    def stats(self) -> dict:
+        with self._lock:
+            places = self._connection.execute("SELECT COUNT(*) FROM places").fetchone()
+        return {
+            "checked": self.checked,
+            "changed_cells": self.changed_cells,
+            "places": places[0],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
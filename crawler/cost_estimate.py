@@ -0,0 +1,204 @@
+import glob
+import json
+import os
+import sqlite3
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+# Places API list prices, USD per 1000 requests
+NEARBY_SEARCH_PRICE = 32.0
+PLACE_DETAILS_PRICE = 17.0
+# Nearby Search returns up to 3 pages of 20 results
+PAGE_SIZE = 20
+MAX_PAGES = 3
+# share of the results of a cell not found before by another cell, used when
+# no incremental store of the sweep measured it
+DEFAULT_UNIQUE_SHARE = 0.5
+
+
+def cell_history(
+    state: str, query: str, folder: str = "."
+) -> Tuple[Dict[str, int], Dict[str, int], Optional[float]]:
+    """
+    Per centroid counts of the past sweeps of `query` over `state`, read from
+    the run journals and the incremental stores found in `folder`
+    :return: (results, saved, unique_share): Nearby Search results per location
+        (incremental stores), places saved per location (journals, duplicates
+        of earlier cells excluded) and the measured share of unique results
+    """
+    results: Dict[str, int] = {}
+    saved: Dict[str, int] = {}
+    unique_share = None
+    for path in sorted(glob.glob(os.path.join(folder, "*.journal"))):
+        with open(path, mode="r", encoding="utf-8") as file:
+            try:
+                run = json.loads(file.readline()).get("run") or {}
+            except json.JSONDecodeError:
+                continue
+            if run.get("state") != state or run.get("query") != query:
+                continue
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                saved[entry["location"]] = len(entry["place_ids"])
+
+    for path in sorted(glob.glob(os.path.join(folder, "incremental_*.sqlite"))):
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'run'"
+            ).fetchone()
+            run = json.loads(row[0]) if row else {}
+            if run.get("state") != state or run.get("query") != query:
+                continue
+            results.update(connection.execute("SELECT location, count FROM cells"))
+            total = connection.execute("SELECT SUM(count) FROM cells").fetchone()[0]
+            places = connection.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+            if total:
+                unique_share = places / total
+        except sqlite3.Error:
+            continue
+        finally:
+            connection.close()
+    return results, saved, unique_share
+
+
+class CostEstimate:
+    """
+    Expected requests and cost of a sweep, per centroid. The results of a cell
+    come from its past sweeps, cells never swept get the mean of the known ones.
+    Details cache hits are not counted, the estimate is an upper bound for them.
+    Attributes: \n
+        `lat, lon:` np.ndarray, centroids \n
+        `known:` np.ndarray, bool, the cell has history \n
+        `results:` np.ndarray, expected Nearby Search results \n
+        `pages:` np.ndarray, expected Nearby Search requests \n
+        `details:` np.ndarray, expected Place Details requests \n
+        `cost:` np.ndarray, USD \n
+    Methods: \n
+        `from_history():` estimate of a sweep from its past runs \n
+        `fit_budget():` densest centroids that fit a budget \n
+        `summary():` totals \n
+        `save_heatmap():` PNG map of the expected results per centroid
+    """
+
+    def __init__(
+        self,
+        locations: list,
+        results: np.ndarray,
+        known: np.ndarray,
+        unique_share: float = DEFAULT_UNIQUE_SHARE,
+        with_details: bool = True,
+        refine: bool = False,
+        nearby_price: float = NEARBY_SEARCH_PRICE,
+        details_price: float = PLACE_DETAILS_PRICE,
+    ):
+        """
+        :param locations: ["lat,lon", radius] pairs
+        :param results: expected Nearby Search results per location
+        :param with_details: the sweep requests Place Details fields
+        :param refine: saturated cells are split into 4 searches
+        """
+        coords = np.array(
+            [location[0].split(",") for location in locations], dtype=np.float64
+        ).reshape(-1, 2)
+        self.lat = coords[:, 0]
+        self.lon = coords[:, 1]
+        self.known = known
+        self.results = results
+        # a next page exists only when more results follow, 20 results are 1 page
+        self.pages = np.clip(np.ceil(results / PAGE_SIZE), 1, MAX_PAGES)
+        if refine:
+            # the true count of a saturated cell is unknown, its 4 children are
+            # counted with every page
+            saturated = results >= PAGE_SIZE * MAX_PAGES
+            self.pages = self.pages + saturated * 4 * MAX_PAGES
+        self.details = results * unique_share if with_details else results * 0
+        self.cost = (self.pages * nearby_price + self.details * details_price) / 1000
+
+    @classmethod
+    def from_history(
+        cls,
+        locations: list,
+        state: str,
+        query: str,
+        folder: str = ".",
+        default_results: float = 20.0,
+        unique_share: Optional[float] = None,
+        **kwargs,
+    ) -> "CostEstimate":
+        """
+        :param default_results: results per cell when the sweep has no history
+        :param unique_share: share of results needing a detail lookup, measured
+            from the history by default
+        :param kwargs: CostEstimate parameters
+        """
+        history, saved, measured = cell_history(state, query, folder)
+        unique_share = unique_share or measured or DEFAULT_UNIQUE_SHARE
+        results = np.full(len(locations), np.nan)
+        for idx, location in enumerate(locations):
+            if location[0] in history:
+                results[idx] = history[location[0]]
+            elif location[0] in saved:
+                # a journal keeps the first finds of a cell only
+                results[idx] = min(
+                    saved[location[0]] / unique_share, PAGE_SIZE * MAX_PAGES
+                )
+        known = ~np.isnan(results)
+        results[~known] = results[known].mean() if known.any() else default_results
+        return cls(locations, results, known, unique_share=unique_share, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def fit_budget(self, budget: float) -> np.ndarray:
+        """
+        :return: indexes, in input order, of the centroids with the most results
+            per dollar whose total cost fits `budget`
+        """
+        density = self.results / np.maximum(self.cost, 1e-12)
+        order = np.argsort(-density, kind="stable")
+        fits = np.cumsum(self.cost[order]) <= budget
+        return np.sort(order[fits])
+
+    def summary(self) -> dict:
+        return {
+            "centroids": len(self),
+            "with_history": int(self.known.sum()),
+            "results": round(float(self.results.sum())),
+            "nearby_requests": round(float(self.pages.sum())),
+            "details_requests": round(float(self.details.sum())),
+            "cost_usd": round(float(self.cost.sum()), 2),
+        }
+
+    def save_heatmap(
+        self,
+        filename: str,
+        title: str = "",
+        boundary: Optional[np.ndarray] = None,
+        kept: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        :param boundary: (n, 2) lon, lat outline of the region
+        :param kept: indexes of the centroids kept by `fit_budget()`
+        """
+        from map_coordinates.files_map_logic.map_grid_reader import (
+            save_density_map,
+        )
+
+        dropped = None
+        if kept is not None:
+            dropped = np.ones(len(self), dtype=bool)
+            dropped[kept] = False
+        save_density_map(
+            self.lat,
+            self.lon,
+            self.results,
+            filename,
+            title=title,
+            label="expected results per centroid",
+            boundary=boundary,
+            dropped=dropped,
+        )
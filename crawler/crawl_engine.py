@@ -0,0 +1,198 @@
+import math
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from crawler.adaptive_refinement import split_cell
+from crawler.metrics import metrics
+from crawler.places_api import (
+    DETAILS_URL,
+    NEARBY_SEARCH_URL,
+    find_places,
+    make_detail_planner,
+    set_rate_limit,
+)
+from crawler.region_filter import RegionFilter
+from crawler.seen_set import SeenSet
+
+_END_OF_CELL = object()
+
+
+class CrawlEngine:
+    """
+    Bounded worker pool that runs the nearby searches of many centroids at once
+    Attributes: \n
+        `max_workers:` int, centroids searched concurrently \n
+        `detail_workers:` int, detail lookups running concurrently \n
+        `nearby_qps:` float, QPS ceiling for the Nearby Search endpoint (0 = no limit,
+            None = keep the session limit) \n
+        `details_qps:` float, QPS ceiling for the Place Details endpoint (0 = no limit,
+            None = keep the session limit) \n
+        `nearby_pool:` Executor, optional pool shared with other engines, replaces
+            the `max_workers` pool \n
+        `details_pool:` Executor, optional pool shared with other engines, replaces
+            the `detail_workers` pool \n
+        `reuse_details:` Callable, reuse(place) details known from a previous crawl,
+            those places get no Details request \n
+        `region:` RegionFilter, optional boundary check before the detail lookups \n
+        `seen:` SeenSet, optional place_id deduplication across centroids \n
+        `refine_max_depth:` int, quadtree levels a saturated cell is split into (0 = off) \n
+        `refine_min_radius:` float, cells are not split below this radius in meters \n
+        `refined_cells:` int, saturated cells split during the run \n
+        `planner:` DetailPlanner, plans the detail lookups of the last crawl \n
+    Methods: \n
+        `crawl():` yields (location, streamed places) in the same order as the input
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        keyword: str,
+        extra_fields: List[str],
+        max_workers: int = 8,
+        detail_workers: int = 16,
+        nearby_qps: Optional[float] = 0.0,
+        details_qps: Optional[float] = 0.0,
+        seen: Optional[SeenSet] = None,
+        refine_max_depth: int = 0,
+        refine_min_radius: float = 250.0,
+        nearby_pool: Optional[Executor] = None,
+        details_pool: Optional[Executor] = None,
+        reuse_details: Optional[Callable[[dict], Optional[dict]]] = None,
+        region: Optional[RegionFilter] = None,
+    ):
+        self.api_key = api_key
+        self.keyword = keyword
+        self.extra_fields = extra_fields
+        self.max_workers = max(1, max_workers)
+        self.detail_workers = max(1, detail_workers)
+        self.seen = seen
+        self.refine_max_depth = refine_max_depth
+        self.refine_min_radius = refine_min_radius
+        self.refined_cells = 0
+        self.planner = None
+        self.nearby_pool = nearby_pool
+        self.details_pool = details_pool
+        self.reuse_details = reuse_details
+        self.region = region
+        self._lock = threading.Lock()
+        if nearby_qps is not None:
+            set_rate_limit(NEARBY_SEARCH_URL, nearby_qps)
+        if details_qps is not None:
+            set_rate_limit(DETAILS_URL, details_qps)
+
+    def crawl(
+        self, locations: List[Tuple[str, float]]
+    ) -> Iterator[Tuple[str, Iterator[dict]]]:
+        """
+        Yields (location, places) in the input order, `places` streams the places of
+        the centroid as they arrive and must be consumed before the next centroid
+        """
+        # centroids and details use separate pools, a centroid task waiting on its
+        # detail lookups can never starve them
+        with ExitStack() as stack:
+            nearby_pool = self.nearby_pool or stack.enter_context(
+                ThreadPoolExecutor(self.max_workers, thread_name_prefix="nearby")
+            )
+            details_pool = self.details_pool or stack.enter_context(
+                ThreadPoolExecutor(self.detail_workers, thread_name_prefix="details")
+            )
+            self.planner = make_detail_planner(
+                self.api_key, self.extra_fields, details_pool, self.reuse_details
+            )
+            pending = deque()
+            try:
+                # keep a bounded window of in-flight centroids, results are yielded
+                # in input order so the output matches the serial sweep
+                for location, radius in locations:
+                    out = queue.SimpleQueue()
+                    future = nearby_pool.submit(
+                        self._stream_cell, location, radius, out
+                    )
+                    pending.append((location, out, future))
+                    if len(pending) >= 2 * self.max_workers:
+                        yield from self._next_cell(pending)
+                while pending:
+                    yield from self._next_cell(pending)
+            finally:
+                # a crawl stopped early must not leave its cells queued in a
+                # shared pool
+                for _, _, future in pending:
+                    future.cancel()
+
+    def _next_cell(self, pending: deque) -> Iterator[Tuple[str, Iterator[dict]]]:
+        location, out, future = pending.popleft()
+        places = self._unique(out, future)
+        yield location, places
+        # whatever the caller left unread is drained so the worker output is released
+        for _ in places:
+            pass
+
+    def _stream_cell(
+        self, location: str, radius: float, out: queue.SimpleQueue
+    ) -> None:
+        try:
+            # the whole search of the cell (find_places) runs on this worker
+            with metrics.profile(), metrics.timer("cell_search"):
+                for place in self._search_cell(location, radius):
+                    out.put(place)
+        finally:
+            out.put(_END_OF_CELL)
+
+    def _search_cell(
+        self,
+        location: str,
+        radius: float,
+        depth: int = 0,
+        found: Optional[set] = None,
+    ) -> Iterator[dict]:
+        """
+        Nearby search of one cell. A cell whose search hit the results cap is split
+        into 4 smaller cells, only those are queried again (depth first, so the
+        order of the places is deterministic).
+        """
+        found = set() if found is None else found
+        search = find_places(
+            api_key=self.api_key,
+            location=location,
+            keyword=self.keyword,
+            extra_fields=self.extra_fields,
+            radius=radius,
+            seen=self.seen,
+            planner=self.planner,
+            region=self.region,
+            # the children of a split cell cover its places again, their details
+            # are not fetched twice
+            skip=found,
+        )
+        for place in search:
+            if place.place_id not in found:
+                found.add(place.place_id)
+                yield place
+        if (
+            not search.saturated
+            or depth >= self.refine_max_depth
+            or radius / math.sqrt(2) < self.refine_min_radius
+        ):
+            return
+
+        with self._lock:
+            self.refined_cells += 1
+        metrics.inc("refined_cells")
+        for child_location, child_radius in split_cell(location, radius):
+            yield from self._search_cell(child_location, child_radius, depth + 1, found)
+
+    def _unique(self, out: queue.SimpleQueue, future: Future) -> Iterator[dict]:
+        # the seen-set is only filled here, in centroid order, so the places kept
+        # do not depend on which worker finished first
+        while True:
+            place = out.get()
+            if place is _END_OF_CELL:
+                break
+            if self.seen is None or self.seen.add(place.place_id):
+                yield place
+        # re-raise the error of a failed worker
+        future.result()
@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from crawler.http_session import QuotaExceededError
+
+# Google Maps Platform quotas are reset at midnight Pacific Time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class DailyQuota:
+    """
+    Request budget per day shared by every job of a run, the requests already
+    spent today are kept in a JSON file so later runs of the same day see them
+    Attributes: \n
+        `path:` str, location of the usage file \n
+        `daily_requests:` int, requests allowed per day (0 = no limit) \n
+        `used:` int, requests spent today \n
+    Methods: \n
+        `spend():` counts a request, raises QuotaExceededError past the budget \n
+        `remaining():` requests left today \n
+        `save():` writes the usage file
+    """
+
+    def __init__(self, path: str, daily_requests: int, save_every: int = 50):
+        self.path = path
+        self.daily_requests = daily_requests
+        self.save_every = save_every
+        self.used = 0
+        self._day = self._today()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, mode="r", encoding="utf-8") as file:
+                usage = json.load(file)
+            if usage.get("day") == self._day:
+                self.used = usage["used"]
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+    def spend(self) -> None:
+        with self._lock:
+            day = self._today()
+            if day != self._day:
+                self._day, self.used = day, 0
+            if self.daily_requests and self.used >= self.daily_requests:
+                raise QuotaExceededError(
+                    f"Daily budget of {self.daily_requests} requests spent"
+                )
+            self.used += 1
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def remaining(self) -> float:
+        if not self.daily_requests:
+            return float("inf")
+        with self._lock:
+            if self._today() != self._day:
+                return self.daily_requests
+            return max(0, self.daily_requests - self.used)
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        # write and rename, a crash never leaves a half written file
+        temporary = f"{self.path}.tmp"
+        with open(temporary, mode="w", encoding="utf-8") as file:
+            json.dump({"day": self._day, "used": self.used}, file)
+        os.replace(temporary, self.path)
+        self._unsaved = 0
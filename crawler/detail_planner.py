@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import Executor
+from typing import Callable, Iterator, List, Optional
+from crawler.details_cache import DetailsCache
+from crawler.metrics import metrics
+from files.sinks import Place
+
+# Place Details field names whose key in the place payload is different
+FIELD_KEYS = {
+    "address_component": "address_components",
+    "photo": "photos",
+    "review": "reviews",
+    "type": "types",
+}
+
+
+def field_key(field: str) -> str:
+    """
+    Key of the place payload filled by a Details field ("geometry/location" -> "geometry")
+    """
+    field = field.split("/")[0]
+    return FIELD_KEYS.get(field, field)
+
+
+class DetailPlanner:
+    """
+    Plans the Place Details lookups of a batch of places: only the fields the search
+    response lacks are requested, cached details are used directly and the
+    remaining lookups go through the worker queue of `executor`
+    Attributes: \n
+        `fields:` List[str], Details fields wanted for every place \n
+        `planned:` int, places that went through the planner \n
+        `complete:` int, places whose search payload already had every field \n
+        `cache_hits:` int, lookups served by the details cache \n
+        `reused:` int, places that kept the details of a previous crawl \n
+        `fetched:` int, Details requests sent \n
+        `batch_duplicates:` int, lookups shared with the same place in the batch \n
+    Methods: \n
+        `missing_fields():` fields to request for a place \n
+        `enrich():` yields the batch places, in order, parsed with their details \n
+        `stats():` planner counters
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str, List[str]], dict],
+        fields: List[str],
+        executor: Optional[Executor] = None,
+        cache: Optional[DetailsCache] = None,
+        reuse: Optional[Callable[[dict], Optional[Place]]] = None,
+    ):
+        """
+        :param fetch: fetch(place_id, fields) network lookup of the details
+        :param reuse: reuse(place) Place already known with its details, or None
+        """
+        self.fetch = fetch
+        self.fields = list(fields)
+        self.executor = executor
+        self.cache = cache
+        self.reuse = reuse
+        self.planned = 0
+        self.complete = 0
+        self.cache_hits = 0
+        self.reused = 0
+        self.fetched = 0
+        self.batch_duplicates = 0
+        self._lock = threading.Lock()
+
+    def missing_fields(self, place: dict) -> List[str]:
+        return [field for field in self.fields if field_key(field) not in place]
+
+    def enrich(self, places: List[dict]) -> Iterator[Place]:
+        plan = []
+        batch = {}
+        complete = cache_hits = duplicates = reused = 0
+        for place in places:
+            fields = self.missing_fields(place)
+            if not fields:
+                complete += 1
+                plan.append((place, {}))
+                continue
+            if self.reuse is not None:
+                known = self.reuse(place)
+                if known is not None:
+                    reused += 1
+                    plan.append((place, known))
+                    continue
+            if self.cache is not None:
+                cached = self.cache.get(place["place_id"], fields)
+                if cached is not None:
+                    cache_hits += 1
+                    plan.append((place, cached))
+                    continue
+            key = (place["place_id"], tuple(fields))
+            if key in batch:
+                duplicates += 1
+            elif self.executor is not None:
+                batch[key] = self.executor.submit(self.fetch, place["place_id"], fields)
+            else:
+                # serial path: the lookup runs when the place is consumed
+                batch[key] = None
+            plan.append((place, key))
+
+        with self._lock:
+            self.planned += len(places)
+            self.complete += complete
+            self.cache_hits += cache_hits
+            self.reused += reused
+            self.batch_duplicates += duplicates
+            self.fetched += len(batch)
+        metrics.inc("detail_cache_hits", cache_hits)
+        metrics.inc("detail_lookups_skipped", complete + duplicates)
+
+        results = {}
+        for place, details in plan:
+            if isinstance(details, tuple):
+                key = details
+                if key not in results:
+                    future = batch[key]
+                    if future is None:
+                        results[key] = self.fetch(key[0], list(key[1]))
+                    else:
+                        results[key] = future.result()
+                details = results[key]
+            if isinstance(details, Place):
+                yield details
+            else:
+                yield Place.from_payload(place, details)
+
+    def stats(self) -> dict:
+        return {
+            "planned": self.planned,
+            "complete_in_search": self.complete,
+            "cache_hits": self.cache_hits,
+            "reused": self.reused,
+            "fetched": self.fetched,
+            "batch_duplicates": self.batch_duplicates,
+        }
@@ -0,0 +1,129 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+
+class DetailsCache:
+    """
+    On-disk (SQLite) cache of Place Details results keyed by place_id and fields
+    Attributes: \n
+        `path:` str, location of the sqlite file \n
+        `ttl:` float, seconds an entry is valid \n
+        `max_entries:` int, least recently used entries are evicted past this size \n
+        `hits:` int \n
+        `misses:` int \n
+        `evictions:` int \n
+    Methods: \n
+        `get():` cached result or None \n
+        `put():` store a result \n
+        `stats():` hit/miss counters
+    """
+
+    def __init__(
+        self,
+        path: str = "details_cache.sqlite",
+        ttl: float = 30 * 24 * 3600,
+        max_entries: int = 500_000,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # the shard processes of a host share the file, wait out their writes
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS details_accessed ON details (accessed_at)"
+        )
+        self._connection.commit()
+        self._entries = self._connection.execute(
+            "SELECT COUNT(*) FROM details"
+        ).fetchone()[0]
+
+    @staticmethod
+    def _key(place_id: str, fields: List[str]) -> str:
+        return f"{place_id}|{','.join(sorted(fields))}"
+
+    def get(self, place_id: str, fields: List[str]) -> Optional[dict]:
+        key = DetailsCache._key(place_id, fields)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT result, created_at FROM details WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > self.ttl:
+                self._connection.execute("DELETE FROM details WHERE key = ?", (key,))
+                self._connection.commit()
+                self._entries -= 1
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE details SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, place_id: str, fields: List[str], result: dict) -> None:
+        key = DetailsCache._key(place_id, fields)
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO details VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now),
+            )
+            if cursor.rowcount:
+                self._entries += 1
+            else:
+                self._connection.execute(
+                    "UPDATE details SET result = ?, created_at = ?, accessed_at = ? "
+                    "WHERE key = ?",
+                    (json.dumps(result), now, now, key),
+                )
+            if self._entries > self.max_entries:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        # drop expired entries first, then the least recently used ones,
+        # leaving 10% headroom so eviction does not run on every put
+        cutoff = time.time() - self.ttl
+        self._connection.execute("DELETE FROM details WHERE created_at < ?", (cutoff,))
+        target = int(self.max_entries * 0.9)
+        count = self._connection.execute("SELECT COUNT(*) FROM details").fetchone()[0]
+        if count > target:
+            self._connection.execute(
+                "DELETE FROM details WHERE key IN ("
+                "SELECT key FROM details ORDER BY accessed_at LIMIT ?)",
+                (count - target,),
+            )
+        self.evictions += self._entries - min(count, target)
+        self._entries = min(count, target)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self._entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,160 @@
+import json
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, Optional
+
+try:
+    # optional, several times faster than json on the Places payloads
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+# statuses of the Places API response body
+OK_STATUSES = {"OK", "ZERO_RESULTS", "NOT_FOUND"}
+RETRY_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+
+class PlacesApiError(Exception):
+    """
+    A Places request failed for good (denied, invalid or out of retries)
+    """
+
+
+class QuotaExceededError(PlacesApiError):
+    """
+    The request budget of the day is spent, no more requests are sent
+    """
+
+
+class RateLimiter:
+    """
+    Thread safe limiter that spaces calls to an endpoint at a fixed QPS
+    Attributes: \n
+        `qps:` float, max requests per second (0 disables the limit) \n
+    Methods: \n
+        `wait():` blocks until the next request slot is available
+    """
+
+    def __init__(self, qps: float):
+        self.qps = qps
+        self._interval = 1.0 / qps if qps > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PlacesSession:
+    """
+    Pooled keep-alive HTTP session shared by every Places call of a run
+    Attributes: \n
+        `pool_size:` int, connections kept alive per host \n
+        `max_retries:` int, extra attempts on 5xx, 429, retryable statuses and network errors \n
+        `backoff_base:` float, seconds of the first backoff, doubled on every attempt \n
+        `backoff_max:` float, ceiling of a single backoff \n
+        `timeout:` float, seconds per request \n
+        `page_token_delay:` float, seconds before a next_page_token becomes valid \n
+    Methods: \n
+        `set_rate_limit():` QPS ceiling for an endpoint \n
+        `set_quota():` request budget shared by every endpoint \n
+        `get_json():` GET with retries, returns the decoded body
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 32,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 32.0,
+        timeout: float = 30.0,
+        page_token_delay: float = 2.0,
+    ):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.page_token_delay = page_token_delay
+        self._rate_limiters: Dict[str, RateLimiter] = {}
+        self._quota = None
+
+        self._session = requests.Session()
+        # retries are handled by get_json, urllib3 must not retry on its own
+        adapter = HTTPAdapter(
+            pool_connections=4, pool_maxsize=pool_size, max_retries=0, pool_block=False
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def set_rate_limit(self, url: str, qps: float) -> None:
+        self._rate_limiters[url] = RateLimiter(qps)
+
+    def set_quota(self, quota) -> None:
+        """
+        :param quota: object with a `spend()` method called before every attempt,
+            raising QuotaExceededError once the budget is gone (None = no budget)
+        """
+        self._quota = quota
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter" exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def get_json(
+        self, url: str, params: dict, retry_statuses: Optional[Iterable[str]] = None
+    ) -> dict:
+        """
+        :param retry_statuses: body statuses worth another attempt, RETRY_STATUSES
+            by default
+        :return: decoded response body, its status is one of OK_STATUSES
+        """
+        retry_statuses = RETRY_STATUSES if retry_statuses is None else retry_statuses
+        limiter = self._rate_limiters.get(url)
+        failure = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1))
+            if limiter is not None:
+                limiter.wait()
+            if self._quota is not None:
+                self._quota.spend()
+            try:
+                response = self._session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                failure = repr(error)
+                continue
+
+            if response.status_code >= 500 or response.status_code == 429:
+                failure = f"HTTP {response.status_code}"
+                continue
+            if response.status_code != 200:
+                raise PlacesApiError(f"HTTP {response.status_code} from {url}")
+
+            payload = json_loads(response.content)
+            status = payload.get("status", "OK")
+            if status in retry_statuses:
+                failure = status
+                continue
+            if status not in OK_STATUSES:
+                raise PlacesApiError(
+                    f"{status} from {url}: {payload.get('error_message', '')}"
+                )
+            return payload
+
+        raise PlacesApiError(
+            f"{url} failed after {self.max_retries + 1} attempts: {failure}"
+        )
+
+    def close(self) -> None:
+        self._session.close()
@@ -0,0 +1,133 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from crawler.daily_quota import DailyQuota
+from crawler.http_session import QuotaExceededError
+from map_coordinates.files_map_logic.mesh_cache import load_centroids
+
+
+class CrawlJob:
+    """
+    One sweep of a manifest: a keyword searched over every centroid of a region
+    Attributes: \n
+        `region:` str, model name of the centroids file \n
+        `keyword:` str, nearby search keyword \n
+        `extra_fields:` List[str], place details fields \n
+        `priority:` int, higher runs first \n
+        `centroids:` int, centroids of the region (set by JobScheduler.plan) \n
+        `name:` str, label used for the output and journal files
+    """
+
+    def __init__(
+        self, region: str, keyword: str, extra_fields: List[str], priority: int = 0
+    ):
+        self.region = region
+        self.keyword = keyword
+        self.extra_fields = extra_fields
+        self.priority = priority
+        self.centroids = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.region}_{self.keyword}".replace(" ", "_")
+
+    def estimated_requests(self, details_per_centroid: float) -> float:
+        """
+        Rough cost of the sweep: one nearby search per centroid plus the detail
+        lookups, pagination and refinement are not counted
+        """
+        details = details_per_centroid if self.extra_fields else 0.0
+        return self.centroids * (1 + details)
+
+
+def load_manifest(path: str) -> List[CrawlJob]:
+    """
+    :param path: JSON list of {"region", "keyword", "fields", "priority"} jobs,
+        "priority" is optional, a region and keyword pair appears once
+    """
+    with open(path, mode="r", encoding="utf-8") as file:
+        entries = json.load(file)
+    jobs = [
+        CrawlJob(
+            region=entry["region"],
+            keyword=entry["keyword"],
+            extra_fields=entry.get("fields", []),
+            priority=entry.get("priority", 0),
+        )
+        for entry in entries
+    ]
+    # the name keys the output, the journal and the status of a job, two jobs
+    # with the same name would run into the same files
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(
+            f"Jobs with the same region and keyword in {path}: {duplicates}, "
+            "merge their fields into one job"
+        )
+    return jobs
+
+
+class JobScheduler:
+    """
+    Runs many sweeps over the same worker pools under one daily request budget.
+    Jobs start by priority and then cheapest first, so the most sweeps finish
+    within the day's quota, and up to `max_jobs` run at once interleaving their
+    centroids in the shared pools.
+    Attributes: \n
+        `run_job:` Callable, runs a whole job, may raise QuotaExceededError \n
+        `quota:` DailyQuota, shared budget (None = no limit) \n
+        `max_jobs:` int, jobs running at the same time \n
+        `details_per_centroid:` float, detail lookups per centroid of the estimate \n
+    Methods: \n
+        `plan():` sets the job costs and returns the jobs in running order \n
+        `run():` runs the jobs, returns the status of each one
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[[CrawlJob], None],
+        quota: Optional[DailyQuota] = None,
+        max_jobs: int = 2,
+        details_per_centroid: float = 5.0,
+    ):
+        self.run_job = run_job
+        self.quota = quota
+        self.max_jobs = max(1, max_jobs)
+        self.details_per_centroid = details_per_centroid
+
+    def plan(self, jobs: List[CrawlJob]) -> List[CrawlJob]:
+        for job in jobs:
+            job.centroids = len(load_centroids(job.region))
+        return sorted(
+            jobs,
+            key=lambda job: (
+                -job.priority,
+                job.estimated_requests(self.details_per_centroid),
+            ),
+        )
+
+    def run(self, jobs: List[CrawlJob]) -> Dict[str, str]:
+        """
+        :return: job name -> "done", "paused" (budget spent while running, resume
+            it with the journal), "deferred" (not started, no budget left) or
+            "failed: <error>"
+        """
+        # the pool runs the jobs in submission order, the planned one
+        with ThreadPoolExecutor(self.max_jobs, thread_name_prefix="job") as pool:
+            futures = {job.name: pool.submit(self._run, job) for job in jobs}
+        return {name: future.result() for name, future in futures.items()}
+
+    def _run(self, job: CrawlJob) -> str:
+        if self.quota is not None and self.quota.remaining() <= 0:
+            return "deferred"
+        try:
+            self.run_job(job)
+        except QuotaExceededError:
+            return "paused"
+        except Exception as error:
+            return f"failed: {error!r}"
+        finally:
+            if self.quota is not None:
+                self.quota.save()
+        return "done"
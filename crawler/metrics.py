@@ -0,0 +1,224 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterator, List, Optional
+
+# upper bounds in seconds of the latency buckets (Prometheus "le")
+LATENCY_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+# prefix of the Prometheus metric names
+METRIC_PREFIX = "places"
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed buckets
+    Attributes: \n
+        `count:` int, observations \n
+        `total:` float, sum of the observed seconds \n
+        `buckets:` List[int], observations per bucket, the last one is +Inf \n
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        for idx, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[idx] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimated from the buckets, linear inside the bucket of the quantile
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for idx, bucket in enumerate(self.buckets):
+            if bucket and seen + bucket >= rank:
+                if idx == len(LATENCY_BUCKETS):
+                    return lower
+                upper = LATENCY_BUCKETS[idx]
+                return lower + (upper - lower) * (rank - seen) / bucket
+            seen += bucket
+            if idx < len(LATENCY_BUCKETS):
+                lower = LATENCY_BUCKETS[idx]
+        return lower
+
+
+class Metrics:
+    """
+    Thread safe counters and latency histograms of the crawl stages, plus the
+    optional cProfile hooks
+    Attributes: \n
+        `counters:` Dict[str, float] \n
+        `histograms:` Dict[str, Histogram], seconds per stage \n
+        `profiling:` bool, the profile() hooks are recording \n
+    Methods: \n
+        `inc():` adds to a counter \n
+        `observe():` records a stage duration \n
+        `timer():` context manager timing a stage \n
+        `profile():` context manager profiling a hook while profiling is on \n
+        `profiled():` decorator version of profile() \n
+        `summary():` counters and per stage count, mean, p50, p99 \n
+        `save():` JSON summary, or Prometheus textfile for a `.prom` path \n
+        `save_profile():` merged cProfile stats, read them with `python -m pstats`
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.profiling = False
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+        self._local = threading.local()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def enable_profiling(self) -> None:
+        self.profiling = True
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        if not self.profiling:
+            yield
+            return
+        # one profiler per thread, nested hooks keep the outer one running
+        local = self._local
+        if getattr(local, "profiler", None) is None:
+            local.profiler = cProfile.Profile()
+            local.depth = 0
+            with self._lock:
+                self._profiles.append(local.profiler)
+        local.depth += 1
+        if local.depth == 1:
+            try:
+                local.profiler.enable()
+            except ValueError:
+                # python >= 3.12 allows a single active profiler, another thread
+                # holds it: this call is not profiled
+                local.depth = -1
+        try:
+            yield
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                local.profiler.disable()
+            elif local.depth < 0:
+                local.depth = 0
+
+    def profiled(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.profile():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {
+                    name: {
+                        "count": histogram.count,
+                        "total_s": histogram.total,
+                        "mean_s": histogram.total / histogram.count,
+                        "p50_s": histogram.quantile(0.5),
+                        "p99_s": histogram.quantile(0.99),
+                    }
+                    for name, histogram in self.histograms.items()
+                    if histogram.count
+                },
+            }
+
+    def prometheus(self) -> str:
+        """
+        Metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, histogram in sorted(self.histograms.items()):
+                metric = f"{METRIC_PREFIX}_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+                for bound, bucket in zip(bounds, histogram.buckets):
+                    cumulative += bucket
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum {histogram.total}")
+                lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path: str) -> None:
+        if path.endswith(".prom"):
+            content = self.prometheus()
+        else:
+            content = json.dumps(self.summary(), indent=2)
+        # the textfile collector may read the file at any time, write and rename
+        temporary = f"{path}.tmp"
+        with open(temporary, mode="w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary, path)
+
+    def save_profile(self, path: str) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        return stats
+
+
+metrics = Metrics()
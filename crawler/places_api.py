@@ -0,0 +1,198 @@
+import os
+import time
+from typing import Callable, Iterator, List, Optional
+from concurrent.futures import Executor
+from crawler.detail_planner import DetailPlanner
+from crawler.details_cache import DetailsCache
+from crawler.http_session import RETRY_STATUSES, PlacesSession
+from crawler.metrics import metrics
+from crawler.region_filter import RegionFilter
+from crawler.seen_set import SeenSet
+
+# PLACES_API_BASE_URL points the crawl to another server, e.g. the offline mock
+# in benchmarks/mock_places_server.py
+PLACES_API_BASE_URL = os.getenv(
+    "PLACES_API_BASE_URL", "https://maps.googleapis.com/maps/api/place"
+).rstrip("/")
+NEARBY_SEARCH_URL = f"{PLACES_API_BASE_URL}/nearbysearch/json"
+DETAILS_URL = f"{PLACES_API_BASE_URL}/details/json"
+# Nearby Search returns at most 3 pages of 20 results
+MAX_NEARBY_RESULTS = 60
+
+
+_session = PlacesSession()
+_details_cache: Optional[DetailsCache] = None
+
+
+def set_session(session: PlacesSession) -> None:
+    global _session
+    _session = session
+
+
+def set_rate_limit(url: str, qps: float) -> None:
+    _session.set_rate_limit(url, qps)
+
+
+def set_details_cache(cache: Optional[DetailsCache]) -> None:
+    global _details_cache
+    _details_cache = cache
+
+
+def get_place_details(api_key: str, place_id: str, fields: list):
+    if _details_cache is not None:
+        cached = _details_cache.get(place_id, fields)
+        if cached is not None:
+            return cached
+    return fetch_place_details(api_key, place_id, fields)
+
+
+def fetch_place_details(api_key: str, place_id: str, fields: list):
+    """
+    Place Details request, skipping the cache lookup (the result is still cached)
+    """
+    params = {"key": api_key, "place_id": place_id, "fields": ",".join(fields)}
+    with metrics.profile(), metrics.timer("place_details"):
+        detail_results = _session.get_json(DETAILS_URL, params=params)
+    if _details_cache is not None and "result" in detail_results:
+        _details_cache.put(place_id, fields, detail_results["result"])
+    return detail_results.get("result", {})
+
+
+def make_detail_planner(
+    api_key: str,
+    fields: List[str],
+    executor: Optional[Executor] = None,
+    reuse: Optional[Callable[[dict], Optional[dict]]] = None,
+) -> DetailPlanner:
+    return DetailPlanner(
+        fetch=lambda place_id, planned_fields: fetch_place_details(
+            api_key, place_id, planned_fields
+        ),
+        fields=fields,
+        executor=executor,
+        cache=_details_cache,
+        reuse=reuse,
+    )
+
+
+class NearbySearch:
+    """
+    Lazy nearby search around a location, iterating it runs the search page by page
+    and yields every place enriched with its details as soon as they arrive
+    Attributes: \n
+        `results_number:` int, results returned by the search before deduplication \n
+        `saturated:` bool, the search hit the Nearby Search cap and may miss places \n
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        location: str,
+        keyword: str,
+        extra_fields: List[str],
+        radius: float,
+        executor: Optional[Executor] = None,
+        seen: Optional[SeenSet] = None,
+        planner: Optional[DetailPlanner] = None,
+        region: Optional[RegionFilter] = None,
+        skip: Optional[set] = None,
+    ):
+        self.api_key = api_key
+        self.location = location
+        self.keyword = keyword
+        self.extra_fields = extra_fields
+        self.radius = radius
+        if planner is None:
+            planner = make_detail_planner(api_key, extra_fields, executor)
+        self.planner = planner
+        self.seen = seen
+        self.skip = skip
+        self.region = region
+        self.results_number = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.results_number >= MAX_NEARBY_RESULTS
+
+    def __iter__(self) -> Iterator[dict]:
+        params = {
+            "key": self.api_key,
+            "location": self.location,  # center latitude, longitude
+            "radius": self.radius,  # search radius in meters
+            "keyword": self.keyword,
+        }
+
+        with metrics.timer("nearby_search"):
+            results = _session.get_json(NEARBY_SEARCH_URL, params=params)
+        while True:
+            page_places = results.get("results", [])
+            self.results_number += len(page_places)
+            if self.seen is not None:
+                page_places = [
+                    place
+                    for place in page_places
+                    if not self.seen.seen_before(place["place_id"])
+                ]
+            if self.skip:
+                page_places = [
+                    place for place in page_places if place["place_id"] not in self.skip
+                ]
+
+            # Fetch additional details
+            if self.region is None:
+                yield from self.planner.enrich(page_places)
+            else:
+                yield from self.region.enrich(page_places, self.planner.enrich)
+
+            if "next_page_token" not in results:
+                break
+            params["pagetoken"] = results["next_page_token"]
+            # the token is only valid a moment after it was issued, until then the
+            # API answers INVALID_REQUEST
+            with metrics.timer("pagination_wait"):
+                time.sleep(_session.page_token_delay)
+            with metrics.timer("nearby_search"):
+                results = _session.get_json(
+                    NEARBY_SEARCH_URL,
+                    params=params,
+                    retry_statuses=RETRY_STATUSES | {"INVALID_REQUEST"},
+                )
+
+
+def find_places(
+    api_key: str,
+    location: str,
+    keyword: str,
+    extra_fields: List[str],
+    radius: float,
+    executor: Optional[Executor] = None,
+    seen: Optional[SeenSet] = None,
+    planner: Optional[DetailPlanner] = None,
+    region: Optional[RegionFilter] = None,
+    skip: Optional[set] = None,
+) -> NearbySearch:
+    """
+    Nearby search around `location`, every result is enriched with its details.
+    The search is lazy: places are fetched and yielded while iterating the result.
+    :param executor: optional pool used to run the detail lookups of a page at once,
+        the order of the places is the same as the serial path
+    :param seen: place_ids already saved, those places are dropped before the
+        detail lookup
+    :param planner: shared DetailPlanner, by default one is built for the search
+        from `extra_fields` and `executor`
+    :param region: boundary check of the places, run before the detail lookup
+    :param skip: place_ids already found by the cell being refined, those places
+        are dropped before the detail lookup
+    """
+    return NearbySearch(
+        api_key=api_key,
+        location=location,
+        keyword=keyword,
+        extra_fields=extra_fields,
+        radius=radius,
+        executor=executor,
+        seen=seen,
+        planner=planner,
+        region=region,
+        skip=skip,
+    )
@@ -0,0 +1,76 @@
+import threading
+from typing import Callable, Iterator, List
+from files.sinks import Place
+from map_coordinates.files_map_logic.polygon import BoundaryIndex
+
+
+class RegionFilter:
+    """
+    Checks the search results against the boundary of the region before their
+    detail lookup: outside places are tagged and kept without details, or
+    dropped. The boundary files are coarse outlines made for meshing, coastal
+    towns fall outside of them, dropping is only as accurate as the boundary.
+    Attributes: \n
+        `index:` BoundaryIndex, boundary of the region \n
+        `drop:` bool, drop the outside places instead of tagging them \n
+        `inside:` int, places inside the region \n
+        `outside:` int, places outside the region \n
+    Methods: \n
+        `mark():` sets `in_region` on the places, returns the inside mask \n
+        `enrich():` runs the detail lookup of the inside places only \n
+        `stats():`
+    """
+
+    def __init__(self, index: BoundaryIndex, drop: bool = False):
+        self.index = index
+        self.drop = drop
+        self.inside = 0
+        self.outside = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_region(cls, model_name: str, mode: str = "tag") -> "RegionFilter":
+        """
+        :param mode: "tag" or "drop"
+        """
+        if mode not in ("drop", "tag"):
+            raise ValueError(f"Unknown region filter mode: {mode}")
+        return cls(BoundaryIndex.from_region(model_name), drop=mode == "drop")
+
+    def mark(self, places: List[dict]) -> List[bool]:
+        # a place without coordinates can not be placed, it is kept
+        locations = [place.get("geometry", {}).get("location", {}) for place in places]
+        known = [idx for idx, location in enumerate(locations) if "lat" in location]
+        inside = [True] * len(places)
+        if known:
+            mask = self.index.contains(
+                [locations[idx]["lng"] for idx in known],
+                [locations[idx]["lat"] for idx in known],
+            )
+            for idx, is_inside in zip(known, mask.tolist()):
+                inside[idx] = is_inside
+        for place, is_inside in zip(places, inside):
+            place["in_region"] = is_inside
+        outside = inside.count(False)
+        with self._lock:
+            self.inside += len(places) - outside
+            self.outside += outside
+        return inside
+
+    def enrich(
+        self, places: List[dict], enrich: Callable[[List[dict]], Iterator[Place]]
+    ) -> Iterator[Place]:
+        """
+        :param enrich: detail lookup of a batch (DetailPlanner.enrich)
+        :return: the places in the same order, without the dropped ones
+        """
+        inside = self.mark(places)
+        enriched = enrich([place for place, ok in zip(places, inside) if ok])
+        for place, ok in zip(places, inside):
+            if ok:
+                yield next(enriched)
+            elif not self.drop:
+                yield Place.from_payload(place)
+
+    def stats(self) -> dict:
+        return {"inside": self.inside, "outside": self.outside, "drop": self.drop}
@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+from typing import List, Optional, Set
+
+
+class RunJournal:
+    """
+    Append-only journal (JSON lines) of the centroids already saved by a sweep
+    Attributes: \n
+        `path:` str, location of the journal file \n
+        `done:` Set[str], locations completed \n
+        `offset:` int, size of the output file after the last completed centroid \n
+        `place_ids:` List[str], place_ids already saved \n
+    Methods: \n
+        `start():` new run, truncates the journal \n
+        `load():` reads the journal of a previous run to resume it \n
+        `mark_done():` records a centroid whose places are already on disk
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        self.offset: int = 0
+        self.place_ids: List[str] = []
+        self._lock = threading.Lock()
+        self._file = None
+
+    def start(self, run_info: dict) -> "RunJournal":
+        self._file = open(self.path, mode="w", encoding="utf-8")
+        self._append({"run": run_info})
+        return self
+
+    def load(self, run_info: Optional[dict] = None) -> "RunJournal":
+        """
+        :param run_info: parameters of the run, must match the journaled ones
+            (None reads the journal of any run)
+        """
+        if not os.path.exists(self.path):
+            return self.start(run_info)
+
+        with open(self.path, mode="r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line cut by the crash
+                    break
+                if "run" in entry:
+                    if run_info is not None and entry["run"] != run_info:
+                        raise ValueError(
+                            f"Journal {self.path} belongs to another run: {entry['run']}"
+                        )
+                    continue
+                self.done.add(entry["location"])
+                self.offset = entry["offset"]
+                self.place_ids.extend(entry["place_ids"])
+        self._file = open(self.path, mode="a", encoding="utf-8")
+        return self
+
+    def mark_done(self, location: str, place_ids: List[str], offset: int) -> None:
+        """
+        :param offset: output file position once the centroid places are flushed
+        """
+        entry = {"location": location, "place_ids": place_ids, "offset": offset}
+        with self._lock:
+            self.done.add(location)
+            self.offset = offset
+            self._append(entry)
+
+    def _append(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
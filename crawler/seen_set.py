@@ -0,0 +1,115 @@
+import hashlib
+import math
+import threading
+from typing import Iterable, Optional
+
+
+class SeenSet:
+    """
+    Exact set of the place_ids already saved during a run
+    Attributes: \n
+        `added:` int, unique keys stored \n
+        `duplicates:` int, keys rejected at write time because they were already stored \n
+        `skipped_lookups:` int, detail lookups avoided because the key was already stored \n
+    Methods: \n
+        `add():` True if the key is new \n
+        `seen_before():` True if the key is already stored \n
+        `stats():` duplicate counters and ratio
+    """
+
+    def __init__(self):
+        self.added = 0
+        self.duplicates = 0
+        self.skipped_lookups = 0
+        self._lock = threading.Lock()
+        self._keys = set()
+
+    def _contains(self, key: str) -> bool:
+        return key in self._keys
+
+    def _insert(self, key: str) -> None:
+        self._keys.add(key)
+
+    def add(self, key: str) -> bool:
+        with self._lock:
+            if self._contains(key):
+                self.duplicates += 1
+                return False
+            self._insert(key)
+            self.added += 1
+            return True
+
+    def update(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                if not self._contains(key):
+                    self._insert(key)
+                    self.added += 1
+
+    def seen_before(self, key: str) -> bool:
+        with self._lock:
+            if self._contains(key):
+                self.skipped_lookups += 1
+                return True
+            return False
+
+    def stats(self) -> dict:
+        duplicates = self.duplicates + self.skipped_lookups
+        checked = self.added + duplicates
+        return {
+            "unique": self.added,
+            "duplicates": duplicates,
+            "duplicate_ratio": duplicates / checked if checked else 0.0,
+            "skipped_detail_lookups": self.skipped_lookups,
+        }
+
+
+class BloomSeenSet(SeenSet):
+    """
+    Fixed-memory seen-set for country scale runs, a Bloom filter sized for
+    `capacity` keys. A false positive drops a new place, its rate stays below
+    `error_rate` while the filter holds at most `capacity` keys.
+    """
+
+    def __init__(self, capacity: int = 5_000_000, error_rate: float = 0.001):
+        super().__init__()
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits_number = max(
+            8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.hashes_number = max(1, round(self.bits_number / capacity * math.log(2)))
+        self._bits = bytearray((self.bits_number + 7) // 8)
+
+    def _positions(self, key: str):
+        # double hashing: h1 + i * h2 gives the k positions from one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for idx in range(self.hashes_number):
+            yield (h1 + idx * h2) % self.bits_number
+
+    def _contains(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def _insert(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+
+def make_seen_set(
+    kind: Optional[str], capacity: int = 5_000_000, error_rate: float = 0.001
+) -> Optional[SeenSet]:
+    """
+    :param kind: "exact", "bloom" or None (no deduplication)
+    """
+    if kind is None:
+        return None
+    if kind == "exact":
+        return SeenSet()
+    if kind == "bloom":
+        return BloomSeenSet(capacity=capacity, error_rate=error_rate)
+    raise ValueError(f"Unknown seen-set kind: {kind}")
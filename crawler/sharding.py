@@ -0,0 +1,147 @@
+import csv
+import os
+import numpy as np
+from typing import List, Optional, Tuple
+from crawler.run_journal import RunJournal
+from crawler.seen_set import SeenSet
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """
+    "K/N" -> (K, N), shards are numbered from 0
+    """
+    shard, shards = (int(value) for value in text.split("/"))
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} out of range for {shards} shards")
+    return shard, shards
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    # 32 bit integers -> 64 bit with a zero between every bit
+    values = values.astype(np.uint64)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton_codes(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Z-order curve position of each point inside the bounding box of all of
+    them, nearby points get nearby codes
+    """
+    codes = []
+    for values in (
+        np.asarray(lat, dtype=np.float64),
+        np.asarray(lon, dtype=np.float64),
+    ):
+        low = values.min()
+        span = values.max() - low
+        scaled = (values - low) / span if span > 0 else np.zeros_like(values)
+        codes.append(_spread_bits(np.round(scaled * 0xFFFFFFFF)))
+    return (codes[0] << np.uint64(1)) | codes[1]
+
+
+def shard_locations(locations: list, shards: int) -> List[list]:
+    """
+    Splits the centroids into `shards` spatially coherent groups of (almost)
+    the same size: contiguous runs of their Morton order. The centroids of a
+    shard keep their input order.
+    :param locations: ["lat,lon", radius] pairs
+    """
+    if not locations:
+        return [[] for _ in range(shards)]
+    coords = np.array(
+        [location[0].split(",") for location in locations], dtype=np.float64
+    )
+    order = np.argsort(morton_codes(coords[:, 0], coords[:, 1]), kind="stable")
+    return [
+        [locations[idx] for idx in np.sort(chunk).tolist()]
+        for chunk in np.array_split(order, shards)
+    ]
+
+
+def shard_filename(filename: str, shard: int, shards: int) -> str:
+    """
+    values_found_x.csv -> values_found_x.shard0of4.csv
+    """
+    root, extension = os.path.splitext(filename)
+    return f"{root}.shard{shard}of{shards}{extension}"
+
+
+def _journaled_place_ids(filename: str) -> List[str]:
+    # place_ids of the rows saved before the last journaled centroid, rows
+    # written after it belong to an interrupted centroid and are skipped
+    path = f"{os.path.splitext(filename)[0]}.journal"
+    if not os.path.exists(filename) or not os.path.exists(path):
+        raise FileNotFoundError(f"Shard output {filename} or its journal is missing")
+    journal = RunJournal(path).load()
+    journal.close()
+    return journal.place_ids
+
+
+def merge_shards(
+    filename: str,
+    shards: int,
+    output_format: str = "csv",
+    seen: Optional[SeenSet] = None,
+) -> dict:
+    """
+    Concatenates the shard outputs of `filename` in shard order into
+    `filename`, a place found by several shards is kept once (first shard wins)
+    :param seen: deduplication of the place_ids, None keeps every row
+    :return: merged rows and dropped duplicates
+    """
+    rows = duplicates = 0
+    if output_format == "csv":
+        with open(filename, mode="w", newline="", encoding="utf-8") as output:
+            writer = csv.writer(output)
+            for shard in range(shards):
+                shard_file = shard_filename(filename, shard, shards)
+                place_ids = _journaled_place_ids(shard_file)
+                with open(shard_file, mode="r", newline="", encoding="utf-8") as file:
+                    reader = csv.reader(file)
+                    header = next(reader)
+                    if shard == 0:
+                        writer.writerow(header)
+                    for place_id, row in zip(place_ids, reader):
+                        if seen is None or seen.add(place_id):
+                            writer.writerow(row)
+                            rows += 1
+                        else:
+                            duplicates += 1
+    elif output_format == "parquet":
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for shard in range(shards):
+                shard_file = shard_filename(filename, shard, shards)
+                # the journal only bounds the rows, the ids come from the file
+                remaining = len(_journaled_place_ids(shard_file))
+                for batch in pq.ParquetFile(shard_file).iter_batches():
+                    if remaining <= 0:
+                        break
+                    batch = batch.slice(0, remaining)
+                    remaining -= batch.num_rows
+                    keep = [
+                        seen is None or seen.add(place_id)
+                        for place_id in batch.column("place_id").to_pylist()
+                    ]
+                    kept = batch.filter(keep)
+                    if writer is None:
+                        writer = pq.ParquetWriter(filename, kept.schema)
+                    writer.write_batch(kept)
+                    rows += kept.num_rows
+                    duplicates += len(keep) - kept.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return {"shards": shards, "rows": rows, "duplicates": duplicates}
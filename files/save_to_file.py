@@ -1,66 +1,173 @@
 import csv
+import time
+from files.sinks import RECORD_FIELDS, Place, PlaceSink, place_record
+
+HEADER = [
+    "Name",
+    "Phone Number",
+    "Website",
+    "url",
+    "Address",
+    "Latitude",
+    "Longitude",
+    "street num",
+    "street",
+    "neighborhood",
+    "locality",
+    "postal_code",
+]
+
+# placeholders written by the CSV output for missing values
+PLACEHOLDERS = {
+    "name": "No Name",
+    "phone_number": "No phone-number",
+    "website": "No Website",
+    "url": "No url",
+    "address": "No Address",
+}
+CSV_FIELDS = (
+    "name",
+    "phone_number",
+    "website",
+    "url",
+    "address",
+    "lat",
+    "lng",
+    "street_num",
+    "street",
+    "neighborhood",
+    "locality",
+    "postal_code",
+)
+
+
+def _place_row(place) -> list:
+    if not isinstance(place, Place):
+        place = Place.from_payload(place)
+    row = []
+    for field in CSV_FIELDS:
+        value = getattr(place, field)
+        row.append(PLACEHOLDERS.get(field, "") if value is None else value)
+    return row
+
+
+class CsvWriter(PlaceSink):
+    """
+    Long-lived CSV writer for a whole run, flushed every `flush_rows` rows or
+    `flush_seconds` seconds so partial results are visible on disk. With
+    `tag_region` an "In Region" column is added for the region filter tags.
+    Methods: \n
+        `write_header():` \n
+        `write():` one place \n
+        `flush():` pushes the buffered rows to disk \n
+        `tell():` position of the file after a flush \n
+        `close():` flushes, and closes the file when the writer opened it
+    """
+
+    def __init__(
+        self,
+        file,
+        flush_rows: int = 100,
+        flush_seconds: float = 5.0,
+        owns_file: bool = False,
+        tag_region: bool = False,
+    ):
+        self.file = file
+        self.tag_region = tag_region
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.owns_file = owns_file
+        self.rows = 0
+        self._writer = csv.writer(file)
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def write_header(self) -> None:
+        self._writer.writerow(HEADER + ["In Region"] if self.tag_region else HEADER)
+
+    def write(self, place) -> None:
+        if not isinstance(place, Place):
+            place = Place.from_payload(place)
+        row = _place_row(place)
+        if self.tag_region:
+            row.append(True if place.in_region is None else place.in_region)
+        self._write_row(row)
+
+    def _write_row(self, row) -> None:
+        self._writer.writerow(row)
+        self.rows += 1
+        self._unflushed += 1
+        if (
+            self._unflushed >= self.flush_rows
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def tell(self) -> int:
+        self.flush()
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.flush()
+        if self.owns_file:
+            self.file.close()
+
+
+class DeltaCsvWriter(CsvWriter):
+    """
+    Changes of an incremental crawl: the typed record of each place (place_id
+    included, empty cells for missing values) after an added / changed /
+    removed column
+    """
+
+    def write_header(self) -> None:
+        self._writer.writerow(("change",) + RECORD_FIELDS)
+
+    def write_change(self, change: str, place) -> None:
+        record = place_record(place)
+        self._write_row(
+            [change]
+            + [
+                "" if record[field] is None else record[field]
+                for field in RECORD_FIELDS
+            ]
+        )
+
+    def write(self, place) -> None:
+        self.write_change("added", place)
+
+
+def open_sink(
+    output_format: str, filename: str, append: bool = False, tag_region: bool = False
+) -> PlaceSink:
+    """
+    :param output_format: "csv" or "parquet"
+    :param append: continue an existing output (csv only)
+    :param tag_region: the csv gets the "In Region" column (parquet always has it)
+    """
+    if output_format == "csv":
+        file = open(filename, mode="a" if append else "w", newline="", encoding="utf-8")
+        sink = CsvWriter(file, owns_file=True, tag_region=tag_region)
+        if not append:
+            sink.write_header()
+        return sink
+    if output_format == "parquet":
+        if append:
+            raise ValueError("A parquet output can not be appended, use csv to resume")
+        from files.save_to_parquet import ParquetWriter
+
+        return ParquetWriter(filename)
+    raise ValueError(f"Unknown output format: {output_format}")
 
 
 def save_to_csv(places, file, is_header: bool = False) -> None:
     writer = csv.writer(file)
     if is_header:
-        writer.writerow(
-            [
-                "Name",
-                "Phone Number",
-                "Website",
-                "url",
-                "Address",
-                "Latitude",
-                "Longitude",
-                "street num",
-                "street",
-                "neighborhood",
-                "locality",
-                "postal_code",
-            ]
-        )
+        writer.writerow(HEADER)
     for place in places:
-        name = place.get("name", "No Name")
-        phone_number = place.get("formatted_phone_number", "No phone-number")
-        website = place.get("website", "No Website")
-        URL = place.get("url", "No url")
-        address = place.get("vicinity", "No Address")
-        location = place.get("geometry", {}).get("location", {})
-        lat = location.get("lat", "")
-        lng = location.get("lng", "")
-
-        street_num = ""
-        street = ""
-        neighborhood = ""
-        locality = ""
-        postal_code = ""
-
-        for component in place.get("address_components", []):
-            if "street_number" in component.get("types", []):
-                street_num = component.get("long_name", "")
-            elif "route" in component.get("types", []):
-                street = component.get("long_name", "")
-            elif "sublocality" in component.get("types", []):
-                neighborhood = component.get("long_name", "")
-            elif "locality" in component.get("types", []):
-                locality = component.get("short_name", "")
-            elif "postal_code" in component.get("types", []):
-                postal_code = component.get("long_name", "")
-
-        writer.writerow(
-            [
-                name,
-                phone_number,
-                website,
-                URL,
-                address,
-                lat,
-                lng,
-                street_num,
-                street,
-                neighborhood,
-                locality,
-                postal_code,
-            ]
-        )
+        writer.writerow(_place_row(place))
@@ -0,0 +1,70 @@
+from files.sinks import RECORD_FIELDS, PlaceSink, place_record
+
+
+class ParquetWriter(PlaceSink):
+    """
+    Columnar output: places are buffered as typed columns and written to a Parquet
+    file as record batches of `batch_rows` rows. Missing values are real nulls,
+    lat/lng are float64 and locality is dictionary encoded.
+    Needs the optional `pyarrow` package.
+    """
+
+    def __init__(self, path: str, batch_rows: int = 10_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError(
+                "The parquet output needs pyarrow: pip install pyarrow"
+            ) from error
+
+        self._pa = pa
+        self.path = path
+        self.batch_rows = batch_rows
+        self.rows = 0
+        types = {
+            "lat": pa.float64(),
+            "lng": pa.float64(),
+            "locality": pa.dictionary(pa.int32(), pa.string()),
+            "in_region": pa.bool_(),
+        }
+        self.schema = pa.schema(
+            [(field, types.get(field, pa.string())) for field in RECORD_FIELDS]
+        )
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self._columns = {field: [] for field in RECORD_FIELDS}
+        self._buffered = 0
+
+    def write(self, place) -> None:
+        record = place_record(place)
+        for field, column in self._columns.items():
+            column.append(record[field])
+        self.rows += 1
+        self._buffered += 1
+        if self._buffered >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+        pa = self._pa
+        arrays = [
+            (
+                pa.array(self._columns[field], type=pa.string()).dictionary_encode()
+                if field == "locality"
+                else pa.array(self._columns[field], type=self.schema.field(field).type)
+            )
+            for field in RECORD_FIELDS
+        ]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self._columns = {field: [] for field in RECORD_FIELDS}
+        self._buffered = 0
+
+    def tell(self) -> None:
+        # a Parquet file can not be truncated back to a journaled position, so the
+        # output has no resumable offset
+        return None
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
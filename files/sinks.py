@@ -0,0 +1,147 @@
+from typing import Optional
+
+# address component type -> record field, the first matching type of a
+# component wins (same precedence as the original if/elif chain)
+ADDRESS_TYPES = (
+    ("street_number", "street_num", "long_name"),
+    ("route", "street", "long_name"),
+    ("sublocality", "neighborhood", "long_name"),
+    ("locality", "locality", "short_name"),
+    ("postal_code", "postal_code", "long_name"),
+)
+
+RECORD_FIELDS = (
+    "place_id",
+    "name",
+    "phone_number",
+    "website",
+    "url",
+    "address",
+    "lat",
+    "lng",
+    "street_num",
+    "street",
+    "neighborhood",
+    "locality",
+    "postal_code",
+    "business_status",
+    "in_region",
+)
+
+
+class Place:
+    """
+    Compact record of a place with only the fields the outputs use. It is parsed
+    once from the Nearby Search payload and its details, so the raw response
+    dicts (photos, opening hours, plus_code, ...) are not kept around.
+    Attributes: \n
+        one per RECORD_FIELDS entry, missing values are None \n
+    Methods: \n
+        `from_payload():` parses a search result and its details \n
+        `from_record():` rebuilds a place from `as_record()` \n
+        `as_record():` dict of RECORD_FIELDS
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, **fields):
+        for field in RECORD_FIELDS:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_payload(cls, place: dict, details: Optional[dict] = None) -> "Place":
+        """
+        :param place: Nearby Search result
+        :param details: Place Details result, its keys win over the search ones
+        """
+        if details:
+            # same precedence as place.update(details), without building the merge
+            def get(key, default=None):
+                return details[key] if key in details else place.get(key, default)
+
+        else:
+            get = place.get
+
+        record = cls.__new__(cls)
+        record.place_id = get("place_id")
+        record.name = get("name")
+        record.phone_number = get("formatted_phone_number")
+        record.website = get("website")
+        record.url = get("url")
+        record.address = get("vicinity")
+        location = (get("geometry") or {}).get("location", {})
+        lat = location.get("lat")
+        lng = location.get("lng")
+        record.lat = float(lat) if lat is not None else None
+        record.lng = float(lng) if lng is not None else None
+        record.street_num = None
+        record.street = None
+        record.neighborhood = None
+        record.locality = None
+        record.postal_code = None
+        record.business_status = get("business_status")
+        # set by the region filter, None when the run had none
+        record.in_region = get("in_region")
+        for component in get("address_components") or ():
+            types = component.get("types", ())
+            for type_name, field, name_key in ADDRESS_TYPES:
+                if type_name in types:
+                    setattr(record, field, component.get(name_key, ""))
+                    break
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Place":
+        return cls(**record)
+
+    def as_record(self) -> dict:
+        return {field: getattr(self, field) for field in RECORD_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"Place({self.place_id!r}, {self.name!r})"
+
+
+def place_record(place) -> dict:
+    """
+    Typed fields of a place (Place or raw payload dict): missing values are None,
+    lat/lng are floats and the address components are scanned once
+    """
+    if not isinstance(place, Place):
+        place = Place.from_payload(place)
+    return place.as_record()
+
+
+class PlaceSink:
+    """
+    Output of a crawl run, places are written one by one in arrival order
+    Methods: \n
+        `write_header():` called once on a new output \n
+        `write():` one place \n
+        `flush():` pushes the buffered places to disk \n
+        `tell():` durable position of the output, used by the run journal \n
+        `close():`
+    """
+
+    rows: int = 0
+
+    def write_header(self) -> None:
+        pass
+
+    def write(self, place) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def tell(self) -> Optional[int]:
+        self.flush()
+        return self.rows
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
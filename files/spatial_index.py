@@ -0,0 +1,322 @@
+"""
+Spatial index over harvested places: a KD-tree on the unit-sphere (x, y, z) of
+each lat/lng, so Euclidean chord distances order the points the same way as the
+great-circle ones. Usage from the root folder:
+
+    python -m files.spatial_index build values_found_buenos_aires.csv places_index.npz
+    python -m files.spatial_index query places_index.npz -34.60 -58.38 --radius 2000
+    python -m files.spatial_index query places_index.npz -34.60 -58.38 --nearest 5
+"""
+
+import argparse
+import csv
+import heapq
+import numpy as np
+from typing import Iterable, List, Tuple
+from files.sinks import place_record
+
+EARTH_RADIUS = 6371.0 * 1000  # meters
+LEAF_SIZE = 64
+# queries start from the first tree level with at least this many nodes
+START_NODES = 512
+
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.stack(
+        [cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1
+    )
+
+
+def _chord(meters: float) -> float:
+    return 2 * np.sin(min(meters / EARTH_RADIUS, np.pi) / 2)
+
+
+def _meters(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+class PlaceIndex:
+    """
+    KD-tree over the places of a sweep with leaf buckets and per-node bounding boxes
+    Attributes: \n
+        `names:` np.ndarray, place name per row \n
+        `place_ids:` np.ndarray, place_id per row ("" when the output has none) \n
+        `lat:` np.ndarray \n
+        `lng:` np.ndarray \n
+    Methods: \n
+        `from_places():` builds the index from place dicts (find_places output) \n
+        `from_file():` builds the index from a csv or parquet sweep output \n
+        `load():` / `save():` .npz persistence \n
+        `within_radius():` rows within a distance of a point \n
+        `nearest():` k nearest rows of a point \n
+        `within_bbox():` rows inside a lat/lng box
+    """
+
+    def __init__(self, names, place_ids, lat, lng, tree=None):
+        self.names = np.asarray(names, dtype=str)
+        self.place_ids = np.asarray(place_ids, dtype=str)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        if tree is None:
+            tree = PlaceIndex._build(_unit_vectors(self.lat, self.lng))
+        (
+            self._points,
+            self._rows,
+            self._start,
+            self._end,
+            self._children,
+            self._box_min,
+            self._box_max,
+        ) = tree
+        nodes = np.zeros(1, dtype=np.int64)
+        while len(nodes) < START_NODES and (self._children[nodes, 0] >= 0).all():
+            nodes = self._children[nodes].ravel()
+        self._start_nodes = nodes
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @staticmethod
+    def _build(points: np.ndarray):
+        rows = np.arange(len(points))
+        start, end, children, box_min, box_max = [], [], [], [], []
+
+        def add_node(first: int, last: int) -> int:
+            node = len(start)
+            block = points[rows[first:last]]
+            start.append(first)
+            end.append(last)
+            children.append([-1, -1])
+            box_min.append(block.min(axis=0) if len(block) else np.zeros(3))
+            box_max.append(block.max(axis=0) if len(block) else np.zeros(3))
+            if last - first > LEAF_SIZE:
+                # split on the widest axis at the median
+                axis = int(np.argmax(box_max[node] - box_min[node]))
+                middle = (last - first) // 2
+                order = np.argpartition(block[:, axis], middle)
+                rows[first:last] = rows[first:last][order]
+                children[node] = [
+                    add_node(first, first + middle),
+                    add_node(first + middle, last),
+                ]
+            return node
+
+        add_node(0, len(points))
+        return (
+            points[rows],
+            rows,
+            np.array(start, dtype=np.int64),
+            np.array(end, dtype=np.int64),
+            np.array(children, dtype=np.int64),
+            np.array(box_min, dtype=np.float64),
+            np.array(box_max, dtype=np.float64),
+        )
+
+    @classmethod
+    def from_places(cls, places: Iterable[dict]) -> "PlaceIndex":
+        names, place_ids, lat, lng = [], [], [], []
+        for place in places:
+            record = place_record(place)
+            if record["lat"] is None or record["lng"] is None:
+                continue
+            names.append(record["name"] or "")
+            place_ids.append(record["place_id"] or "")
+            lat.append(record["lat"])
+            lng.append(record["lng"])
+        return cls(names, place_ids, lat, lng)
+
+    @classmethod
+    def from_file(cls, path: str) -> "PlaceIndex":
+        """
+        :param path: values_found_{state}.csv or .parquet
+        """
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(path, columns=["name", "place_id", "lat", "lng"])
+            table = table.filter(table["lat"].is_valid())
+            columns = table.to_pydict()
+            return cls(
+                [name or "" for name in columns["name"]],
+                [place_id or "" for place_id in columns["place_id"]],
+                columns["lat"],
+                columns["lng"],
+            )
+
+        names, lat, lng = [], [], []
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                if row["Latitude"] and row["Longitude"]:
+                    names.append(row["Name"])
+                    lat.append(float(row["Latitude"]))
+                    lng.append(float(row["Longitude"]))
+        return cls(names, [""] * len(names), lat, lng)
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            names=self.names,
+            place_ids=self.place_ids,
+            lat=self.lat,
+            lng=self.lng,
+            points=self._points,
+            rows=self._rows,
+            start=self._start,
+            end=self._end,
+            children=self._children,
+            box_min=self._box_min,
+            box_max=self._box_max,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "PlaceIndex":
+        data = np.load(path)
+        tree = tuple(
+            data[key]
+            for key in (
+                "points",
+                "rows",
+                "start",
+                "end",
+                "children",
+                "box_min",
+                "box_max",
+            )
+        )
+        return cls(data["names"], data["place_ids"], data["lat"], data["lng"], tree)
+
+    def _box_distance2(self, node: int, point: np.ndarray) -> float:
+        gap = np.maximum(self._box_min[node] - point, 0.0) + np.maximum(
+            point - self._box_max[node], 0.0
+        )
+        return float(gap @ gap)
+
+    def _leaf_rows(self, point: np.ndarray, limit2: float) -> np.ndarray:
+        # level by level traversal, every level is pruned in one vectorized step
+        nodes = self._start_nodes
+        leaves = []
+        while nodes.size:
+            gap = np.maximum(self._box_min[nodes] - point, 0.0) + np.maximum(
+                point - self._box_max[nodes], 0.0
+            )
+            nodes = nodes[np.einsum("ij,ij->i", gap, gap) <= limit2]
+            is_leaf = self._children[nodes, 0] < 0
+            leaves.append(nodes[is_leaf])
+            nodes = self._children[nodes[~is_leaf]].ravel()
+        leaves = np.concatenate(leaves)
+        # positions start..end of every leaf, concatenated
+        lengths = self._end[leaves] - self._start[leaves]
+        offsets = np.repeat(self._start[leaves] - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def within_radius(
+        self, lat: float, lng: float, meters: float
+    ) -> List[Tuple[int, float]]:
+        """
+        :return: [(row, distance in meters)] closest first
+        """
+        if not len(self):
+            return []
+        point = _unit_vectors(lat, lng)
+        limit2 = _chord(meters) ** 2
+        positions = self._leaf_rows(point, limit2)
+        block = self._points[positions] - point
+        distances2 = np.einsum("ij,ij->i", block, block)
+        inside = distances2 <= limit2
+        positions, distances2 = positions[inside], distances2[inside]
+        order = np.argsort(distances2)
+        meters_ = _meters(np.sqrt(distances2[order]))
+        return list(zip(self._rows[positions[order]].tolist(), meters_.tolist()))
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[int, float]]:
+        """
+        :return: [(row, distance in meters)] of the k closest places
+        """
+        if not len(self):
+            return []
+        point = _unit_vectors(lat, lng)
+        best = []  # max-heap of (-distance2, row)
+        queue = [(0.0, 0)]
+        while queue:
+            node_distance2, node = heapq.heappop(queue)
+            if len(best) == k and node_distance2 > -best[0][0]:
+                break
+            left, right = self._children[node]
+            if left >= 0:
+                for child in (left, right):
+                    heapq.heappush(queue, (self._box_distance2(child, point), child))
+                continue
+            block = self._points[self._start[node] : self._end[node]] - point
+            block2 = np.einsum("ij,ij->i", block, block)
+            for row, distance2 in zip(
+                self._rows[self._start[node] : self._end[node]].tolist(),
+                block2.tolist(),
+            ):
+                if len(best) < k:
+                    heapq.heappush(best, (-distance2, row))
+                elif distance2 < -best[0][0]:
+                    heapq.heapreplace(best, (-distance2, row))
+        best = sorted((-distance2, row) for distance2, row in best)
+        return [(row, float(_meters(np.sqrt(distance2)))) for distance2, row in best]
+
+    def within_bbox(
+        self, lat_min: float, lng_min: float, lat_max: float, lng_max: float
+    ) -> np.ndarray:
+        """
+        :return: rows inside the box
+        """
+        # tree lookup of the circle around the box, then the exact box test
+        center = _unit_vectors((lat_min + lat_max) / 2, (lng_min + lng_max) / 2)
+        corners = _unit_vectors(
+            np.array([lat_min, lat_min, lat_max, lat_max]),
+            np.array([lng_min, lng_max, lng_min, lng_max]),
+        )
+        chord = np.sqrt(((corners - center) ** 2).sum(axis=1)).max()
+        rows = np.array(
+            [
+                row
+                for row, _ in self.within_radius(
+                    (lat_min + lat_max) / 2,
+                    (lng_min + lng_max) / 2,
+                    float(_meters(chord)) + 1.0,
+                )
+            ],
+            dtype=np.int64,
+        )
+        inside = (
+            (self.lat[rows] >= lat_min)
+            & (self.lat[rows] <= lat_max)
+            & (self.lng[rows] >= lng_min)
+            & (self.lng[rows] <= lng_max)
+        )
+        return np.sort(rows[inside])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spatial index of harvested places")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index a csv or parquet sweep output")
+    build.add_argument("output")
+    build.add_argument("index")
+    query = commands.add_parser("query", help="radius or nearest neighbour lookup")
+    query.add_argument("index")
+    query.add_argument("lat", type=float)
+    query.add_argument("lng", type=float)
+    query.add_argument("--radius", type=float, help="meters")
+    query.add_argument("--nearest", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = PlaceIndex.from_file(args.output)
+        index.save(args.index)
+        print(f"{len(index)} places indexed in {args.index}")
+    else:
+        index = PlaceIndex.load(args.index)
+        if args.radius is not None:
+            found = index.within_radius(args.lat, args.lng, args.radius)
+        else:
+            found = index.nearest(args.lat, args.lng, args.nearest)
+        for row, distance in found:
+            print(f"{distance:10.1f} m  {index.names[row]}  {index.place_ids[row]}")
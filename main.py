@@ -1,90 +1,444 @@
-import requests
+import argparse
 import json
 import os
-from files.save_to_file import save_to_csv
-from typing import List
+import subprocess
+import sys
+import time
+from typing import TYPE_CHECKING, Optional
+from files.save_to_file import DeltaCsvWriter, open_sink
+from crawler.cost_estimate import CostEstimate
+from crawler.metrics import metrics
+from crawler.run_journal import RunJournal
+from crawler.seen_set import make_seen_set
+from crawler.sharding import merge_shards, parse_shard, shard_filename, shard_locations
+from map_coordinates.files_map_logic.mesh_cache import load_centroids
 
+# the HTTP stack (requests) is only imported by the runs that call the API, the
+# estimate and merge runs start without it
+if TYPE_CHECKING:
+    from crawler.cell_store import CellStore
+    from crawler.crawl_engine import CrawlEngine
 
-def get_place_details(api_key: str, place_id: str, fields: list):
-    details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-    params = {"key": api_key, "place_id": place_id, "fields": ",".join(fields)}
-    response = requests.get(details_url, params=params)
-    if response.status_code == 200:
-        detail_results = json.loads(response.text)
-        return detail_results.get("result", {})
+PLACES_API_NAMES = (
+    "find_places",
+    "get_place_details",
+    "set_details_cache",
+    "set_session",
+)
+
+
+def __getattr__(name: str):
+    # `from main import find_places` keeps working, loaded on first use
+    if name in PLACES_API_NAMES:
+        from crawler import places_api
+
+        return getattr(places_api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_locations_from_centroids(model_name: str):
+    # binary copy of centroids_{model_name}.txt, rebuilt when the file changes
+    with metrics.timer("centroids_load"):
+        centroids = load_centroids(model_name)
+    return [[f"{lat},{lon}", radius] for lat, lon, radius in centroids.tolist()]
+
+
+def crawl_region(
+    engine: "CrawlEngine",
+    locations: list,
+    filename: str,
+    run_info: dict,
+    output_format: str = "csv",
+    resume: bool = False,
+    label: str = "",
+) -> None:
+    """
+    Sweeps the locations with the engine into `filename`, journaling every saved
+    centroid next to it so the sweep can be resumed
+    :param run_info: parameters of the sweep, a resumed journal must match them
+    :param label: name of the sweep in the progress messages
+    """
+    journal = RunJournal(f"{os.path.splitext(filename)[0]}.journal")
+    if resume and os.path.exists(filename):
+        journal.load(run_info)
     else:
-        return {}
+        journal.start(run_info)
 
+    if journal.done:
+        if engine.seen is not None:
+            engine.seen.update(journal.place_ids)
+        # drop rows written after the last journaled centroid
+        os.truncate(filename, journal.offset)
+        locations = [loc for loc in locations if loc[0] not in journal.done]
+        print(f"Resuming {label}: {len(journal.done)} centroids already saved.")
+    tag_region = engine.region is not None and not engine.region.drop
+    try:
+        with open_sink(
+            output_format, filename, append=bool(journal.done), tag_region=tag_region
+        ) as sink:
+            for location, places_found in engine.crawl(locations):
+                place_ids = []
+                # places are written while the centroid is still being searched
+                for place in places_found:
+                    with metrics.profile(), metrics.timer("sink_write"):
+                        sink.write(place)
+                    place_ids.append(place.place_id)
+                if not place_ids:
+                    print(f"No data found for {label}.")
+                with metrics.timer("journal_write"):
+                    journal.mark_done(location, place_ids, sink.tell())
+                metrics.inc("centroids_done")
+                metrics.inc("places_saved", len(place_ids))
+    finally:
+        journal.close()
+    print(f"Data for {label} saved.")
 
-def find_places(
-    api_key: str, location: str, keyword: str, extra_fields: List[str], radius: float
-):
-    endpoint_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    places = []
 
-    params = {
-        "key": api_key,
-        "location": location,  # center latitude, longitude
-        "radius": radius,  # search radius in meters
-        "keyword": keyword,
-    }
+def crawl_incremental(
+    engine: "CrawlEngine",
+    store: "CellStore",
+    locations: list,
+    snapshot_filename: str,
+    delta_filename: str,
+    output_format: str = "csv",
+    label: str = "",
+) -> None:
+    """
+    Re-queries only the centroids due by the store schedule, writes the snapshot
+    changes to `delta_filename` and the merged snapshot to `snapshot_filename`
+    """
+    due = store.due(locations)
+    print(f"Refreshing {label}: {len(due)} of {len(locations)} centroids due.")
+    with open(delta_filename, mode="w", newline="", encoding="utf-8") as file:
+        delta = DeltaCsvWriter(file)
+        delta.write_header()
+        for location, places_found in engine.crawl(due):
+            for change, place in store.update_cell(location, list(places_found)):
+                delta.write_change(change, place)
+        delta.close()
+    tag_region = engine.region is not None and not engine.region.drop
+    with open_sink(output_format, snapshot_filename, tag_region=tag_region) as sink:
+        for place in store.places():
+            sink.write(place)
+    print(f"Delta for {label} saved: {delta.rows} changes.")
 
-    res = requests.get(endpoint_url, params=params)
-    while res.status_code == 200:
-        results = json.loads(res.text)
-        for place in results["results"]:
-            # Fetch additional details
-            detailed_info = get_place_details(
-                api_key=api_key, place_id=place["place_id"], fields=extra_fields
-            )
-            place.update(detailed_info)
-            places.append(place)
 
-        if "next_page_token" in results:
-            params["pagetoken"] = results["next_page_token"]
-            res = requests.get(endpoint_url, params=params)
-            continue
-        break
-    return places
+def fit_budget(
+    locations: list,
+    state: str,
+    query: str,
+    budget_usd: float,
+    over_budget: str = "refuse",
+    **estimate_options,
+) -> list:
+    """
+    Checks the estimated cost of the whole sweep against `budget_usd`, exits
+    when it is over, or keeps the densest centroids with over_budget="downsample"
+    :param estimate_options: CostEstimate parameters
+    :return: the centroids to sweep
+    """
+    estimate = CostEstimate.from_history(locations, state, query, **estimate_options)
+    cost = float(estimate.cost.sum())
+    if cost <= budget_usd:
+        return locations
+    if over_budget != "downsample":
+        sys.exit(
+            f"Estimated cost {cost:.2f} USD is over the {budget_usd} USD "
+            "budget, see --estimate"
+        )
+    kept = estimate.fit_budget(budget_usd).tolist()
+    print(
+        f"Estimated cost {cost:.2f} USD is over the {budget_usd} USD budget: "
+        f"sweeping the {len(kept)} densest of {len(estimate)} centroids."
+    )
+    return [locations[idx] for idx in kept]
 
 
-def get_locations_from_centroids(model_name: str):
-    centroid_coordinates = []
-    centroids = f"map_coordinates/centroids/centroids_{model_name}.txt"
-    with open(centroids, "r") as file:
-        for line in file:
-            lat, lon, radius = line.strip().split(",")
-            centroid_coordinates.append([f"{lat},{lon}", float(radius)])
-    return centroid_coordinates
+def run_local_shards(
+    shards: int, resume: bool = False, centroids: Optional[str] = None
+) -> bool:
+    """
+    Sweeps every shard in its own `main.py --shard K/N` process
+    :param centroids: JSON file of the centroids to shard instead of the whole
+        grid, e.g. the ones kept by the budget
+    :return: every shard finished
+    """
+    command = [sys.executable, os.path.abspath(__file__)]
+    if resume:
+        command.append("--resume")
+    if centroids:
+        command += ["--centroids", centroids]
+    processes = [
+        subprocess.Popen(command + ["--shard", f"{shard}/{shards}"])
+        for shard in range(shards)
+    ]
+    failed = [shard for shard, process in enumerate(processes) if process.wait()]
+    if failed:
+        print(f"Shards {failed} failed, run again with --resume to finish them.")
+    return not failed
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Google Places sweep over centroids")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the centroids already saved by the last run and append to its output",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="re-query only the centroids due for a refresh, save the changes to a "
+        "delta file and update the snapshot",
+    )
+    parser.add_argument(
+        "--estimate",
+        nargs="*",
+        metavar="KEYWORD",
+        help="dry run: estimate the requests and cost of the sweep of the query (or "
+        "of each KEYWORD) from past runs and save a density heatmap, no API calls",
+    )
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="K/N",
+        help="sweep only shard K (from 0) of N spatial shards of the centroids into "
+        "its own output, one process or host per shard",
+    )
+    sharding.add_argument(
+        "--shards",
+        type=int,
+        metavar="N",
+        help="sweep N shards in local processes, then merge their outputs",
+    )
+    sharding.add_argument(
+        "--merge",
+        type=int,
+        metavar="N",
+        help="only merge the outputs of N shards, e.g. copied from other hosts",
+    )
+    # centroids checked against the budget by the --shards process
+    parser.add_argument("--centroids", help=argparse.SUPPRESS)
+    args = parser.parse_args()
     api_key = os.getenv("API_KEY")
 
     # ----- change if neccesary ----
     state = "buenos_aires"
     query = "veterinaria"
     extra_fields = ["formatted_phone_number", "website", "url", "address_component"]
+    max_workers = 8  # centroids searched at once
+    detail_workers = 16  # place details fetched at once
+    nearby_qps = 10.0  # 0 = no limit, all shards together
+    details_qps = 50.0  # 0 = no limit, all shards together
+    max_retries = 5  # per request, jittered exponential backoff
+    details_cache_path = "details_cache.sqlite"  # None = always fetch details
+    details_cache_ttl_days = 30
+    details_cache_max_entries = 500_000
+    dedup = "exact"  # "exact", "bloom" (country scale runs) or None
+    bloom_capacity = 5_000_000
+    bloom_error_rate = 0.001
+    refine_max_depth = 2  # split saturated cells up to this depth, 0 = off
+    refine_min_radius = 250.0  # meters
+    output_format = "csv"  # "csv" or "parquet" (needs pyarrow, no --resume)
+    region_filter = None  # places outside the boundary: None (kept), "tag" or "drop"
+    refresh_min_days = 7  # --incremental: check interval of a cell that always changes
+    refresh_max_days = 56  # --incremental: check interval of a cell that never changes
+    budget_usd = None  # estimated cost limit of a sweep, None = no limit
+    over_budget = "refuse"  # "refuse", or "downsample" to the densest centroids
+    nearby_price = 32.0  # USD per 1000 Nearby Search requests
+    details_price = 17.0  # USD per 1000 Place Details requests
+    metrics_path = None  # "run_metrics.json", or "run_metrics.prom" (Prometheus)
+    profile_path = None  # "crawl.prof": cProfile of the search, details and writes
     # ------------------------------
+    if args.resume and output_format != "csv":
+        parser.error("--resume is only supported with the csv output")
+    if args.resume and args.incremental:
+        parser.error("--incremental runs are resumed by running them again")
+    if args.incremental and (args.shard or args.shards or args.merge):
+        parser.error("--incremental runs can not be sharded")
+    filename = f"values_found_{state.replace(' ', '_')}.{output_format}"
+    if args.merge:
+        merged = merge_shards(
+            filename,
+            args.merge,
+            output_format,
+            seen=make_seen_set(
+                dedup, capacity=bloom_capacity, error_rate=bloom_error_rate
+            ),
+        )
+        print(f"Shards merged into {filename}: {merged}")
+        sys.exit(0)
+    # requests per second of this process
+    share = args.shard[1] if args.shard else 1
+    label = state
     locations = get_locations_from_centroids(state)
-    places = []
 
     # locations = locations[0:500]
-    filename = f"values_found_{state.replace(' ', '_')}.csv"
-    is_header = True
-    with open(filename, mode="w", newline="", encoding="utf-8") as file:
-        for location, radius in locations:
-            places_found = find_places(
-                api_key=api_key,
-                location=location,
-                keyword=query,
-                extra_fields=extra_fields,
-                radius=radius,
+    run_info = {
+        "state": state,
+        "query": query,
+        "extra_fields": extra_fields,
+        "region_filter": region_filter,
+    }
+    estimate_options = {
+        "with_details": bool(extra_fields),
+        "refine": refine_max_depth > 0,
+        "nearby_price": nearby_price,
+        "details_price": details_price,
+    }
+
+    if args.estimate is not None:
+        from map_coordinates.files_map_logic.map_grid_generation import (
+            get_coordinates_from_file,
+        )
+
+        # the budget holds for the whole sweep, shards are not estimated alone
+        boundary = get_coordinates_from_file(state)
+        for keyword in args.estimate or [query]:
+            estimate = CostEstimate.from_history(
+                locations, state, keyword, **estimate_options
             )
-            if places_found:
-                save_to_csv(places_found, file, is_header)
-            else:
-                print(f"No data found for {state}.")
-            is_header = False
+            kept = estimate.fit_budget(budget_usd) if budget_usd else None
+            heatmap = f"estimate_{state}_{keyword}.png".replace(" ", "_")
+            estimate.save_heatmap(
+                heatmap, title=f"{keyword} - {label}", boundary=boundary, kept=kept
+            )
+            print(f"Estimate for {keyword!r}: {estimate.summary()}, map in {heatmap}")
+            if kept is not None and len(kept) < len(estimate):
+                print(
+                    f"Over the {budget_usd} USD budget: {over_budget} "
+                    f"({len(kept)} centroids fit)"
+                )
+        sys.exit(0)
+    # the budget is checked once on the whole sweep, before it is sharded
+    budget_filename = f"{os.path.splitext(filename)[0]}.budget.json"
+    if args.centroids:
+        with open(args.centroids, mode="r", encoding="utf-8") as file:
+            locations = json.load(file)
+    elif budget_usd:
+        if args.shards and args.resume and os.path.exists(budget_filename):
+            # the history changed while the shards ran, keep the first choice
+            with open(budget_filename, mode="r", encoding="utf-8") as file:
+                locations = json.load(file)
+        else:
+            locations = fit_budget(
+                locations, state, query, budget_usd, over_budget, **estimate_options
+            )
+    if args.shards:
+        # the centroids cache is built above, the shard processes share it
+        centroids = None
+        if budget_usd:
+            centroids = budget_filename
+            with open(centroids, mode="w", encoding="utf-8") as file:
+                json.dump(locations, file)
+        if not run_local_shards(args.shards, resume=args.resume, centroids=centroids):
+            sys.exit(1)
+        merged = merge_shards(
+            filename,
+            args.shards,
+            output_format,
+            seen=make_seen_set(
+                dedup, capacity=bloom_capacity, error_rate=bloom_error_rate
+            ),
+        )
+        print(f"Shards merged into {filename}: {merged}")
+        sys.exit(0)
+    if args.shard:
+        locations = shard_locations(locations, args.shard[1])[args.shard[0]]
+        filename = shard_filename(filename, *args.shard)
+        label = f"{state} shard {args.shard[0]}/{args.shard[1]}"
+        run_info["shard"] = f"{args.shard[0]}/{args.shard[1]}"
+        if metrics_path:
+            metrics_path = shard_filename(metrics_path, *args.shard)
+        if profile_path:
+            profile_path = shard_filename(profile_path, *args.shard)
+
+    from crawler.cell_store import CellStore
+    from crawler.crawl_engine import CrawlEngine
+    from crawler.details_cache import DetailsCache
+    from crawler.http_session import PlacesSession
+    from crawler.places_api import set_details_cache, set_session
+    from crawler.region_filter import RegionFilter
+
+    session = PlacesSession(
+        pool_size=max_workers + detail_workers, max_retries=max_retries
+    )
+    set_session(session)
+    if profile_path:
+        metrics.enable_profiling()
+    details_cache = None
+    if details_cache_path:
+        details_cache = DetailsCache(
+            path=details_cache_path,
+            ttl=details_cache_ttl_days * 24 * 3600,
+            max_entries=details_cache_max_entries,
+        )
+        set_details_cache(details_cache)
+    store = None
+    seen = make_seen_set(dedup, capacity=bloom_capacity, error_rate=bloom_error_rate)
+    if args.incremental:
+        # every cell keeps its full result set, its fingerprint must not depend
+        # on the cells searched before it
+        seen = None
+        store = CellStore(
+            path=f"incremental_{state.replace(' ', '_')}.sqlite",
+            run_info=run_info,
+            min_interval=refresh_min_days * 24 * 3600,
+            max_interval=refresh_max_days * 24 * 3600,
+        )
+    engine = CrawlEngine(
+        api_key=api_key,
+        keyword=query,
+        extra_fields=extra_fields,
+        max_workers=max_workers,
+        detail_workers=detail_workers,
+        nearby_qps=nearby_qps / share,
+        details_qps=details_qps / share,
+        seen=seen,
+        refine_max_depth=refine_max_depth,
+        refine_min_radius=refine_min_radius,
+        reuse_details=store.reuse_details if store is not None else None,
+        region=(
+            RegionFilter.from_region(state, region_filter) if region_filter else None
+        ),
+    )
+    if store is not None:
+        crawl_incremental(
+            engine,
+            store,
+            locations,
+            snapshot_filename=filename,
+            delta_filename=f"delta_{state.replace(' ', '_')}_"
+            f"{time.strftime('%Y%m%d-%H%M%S')}.csv",
+            output_format=output_format,
+            label=state,
+        )
+        print(f"Incremental: {store.stats()}")
+        store.close()
+    else:
+        crawl_region(
+            engine,
+            locations,
+            filename,
+            run_info,
+            output_format=output_format,
+            resume=args.resume,
+            label=label,
+        )
 
-    print(f"Data for {state} saved.")
+    if engine.refined_cells:
+        print(f"Saturated cells split: {engine.refined_cells}")
+    if engine.seen is not None:
+        print(f"Deduplication: {engine.seen.stats()}")
+    if engine.region is not None:
+        print(f"Region filter: {engine.region.stats()}")
+    print(f"Detail lookups: {engine.planner.stats()}")
+    if details_cache is not None:
+        print(f"Details cache: {details_cache.stats()}")
+        details_cache.close()
+    session.close()
+    if metrics_path:
+        metrics.save(metrics_path)
+    if profile_path:
+        metrics.save_profile(profile_path)
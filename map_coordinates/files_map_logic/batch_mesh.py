@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
+from .map_grid_generation import maps_folder, mesh_generation_file
+from .map_grid_reader import Mesh
+
+# region -> content hash of the inputs its mesh and centroids were built from
+hashes_filename = os.path.join(maps_folder, "msh_files", "mesh_hashes.json")
+
+
+def region_hash(model_name: str, size_element: float) -> str:
+    """
+    sha256 of the boundary file content and the element size
+    """
+    digest = hashlib.sha256()
+    with open(
+        os.path.join(maps_folder, "boundaries", f"{model_name}.txt"), "rb"
+    ) as file:
+        digest.update(file.read())
+    digest.update(repr(float(size_element)).encode())
+    return digest.hexdigest()
+
+
+def list_regions() -> List[str]:
+    """
+    Model names of every boundary file
+    """
+    return sorted(
+        os.path.splitext(filename)[0]
+        for filename in os.listdir(os.path.join(maps_folder, "boundaries"))
+        if filename.endswith(".txt")
+    )
+
+
+def _read_hashes() -> Dict[str, str]:
+    try:
+        with open(hashes_filename, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_hashes(hashes: Dict[str, str]) -> None:
+    tmp_path = f"{hashes_filename}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(hashes, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, hashes_filename)
+
+
+def _is_built(model_name: str) -> bool:
+    return os.path.exists(
+        os.path.join(maps_folder, "msh_files", f"{model_name}.msh")
+    ) and os.path.exists(
+        os.path.join(maps_folder, "centroids", f"centroids_{model_name}.txt")
+    )
+
+
+def _build_region(model_name: str, size_element: float) -> Tuple[str, float]:
+    # runs in a worker process: gmsh keeps one global model per process
+    start = time.perf_counter()
+    mesh_generation_file(model_name=model_name, size_element=size_element)
+    # parses the new .msh once and refreshes its binary copy for later readers
+    Mesh.from_cache(model_name).calculate_and_save_centroids(model_name)
+    return model_name, time.perf_counter() - start
+
+
+def generate_meshes(
+    size_element: float,
+    model_names: Optional[List[str]] = None,
+    workers: int = 0,
+    force: bool = False,
+) -> Dict[str, str]:
+    """
+    Headless mesh and centroids generation of many regions, one worker process
+    per region at a time. A region whose boundary file and `size_element` hash
+    to the value saved by its last build is skipped.
+    :param model_names: regions to build, every boundary file by default
+    :param workers: worker processes, the CPU count by default
+    :param force: rebuild the regions even if they are unchanged
+    :return: region -> "built", "unchanged" or "failed: <error>"
+    """
+    model_names = list_regions() if model_names is None else model_names
+    hashes = _read_hashes()
+    current = {name: region_hash(name, size_element) for name in model_names}
+    statuses = {}
+    pending = []
+    for name in model_names:
+        if not force and hashes.get(name) == current[name] and _is_built(name):
+            statuses[name] = "unchanged"
+        else:
+            pending.append(name)
+    if not pending:
+        return statuses
+
+    # spawn: a fresh interpreter per worker, gmsh state is never inherited
+    with ProcessPoolExecutor(
+        max_workers=min(workers or os.cpu_count() or 1, len(pending)),
+        mp_context=get_context("spawn"),
+    ) as pool:
+        futures = {
+            pool.submit(_build_region, name, size_element): name for name in pending
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                _, seconds = future.result()
+            except Exception as error:
+                statuses[name] = f"failed: {error!r}"
+                continue
+            statuses[name] = "built"
+            print(f"{name}: mesh and centroids built in {seconds:.1f}s")
+            # saved as each region finishes, an interrupted batch keeps its progress
+            hashes[name] = current[name]
+            _write_hashes(hashes)
+    return statuses
@@ -0,0 +1,173 @@
+import heapq
+import math
+import os
+import numpy as np
+from typing import Dict, List, Tuple
+from .map_grid_generation import get_coordinates_from_file, maps_folder
+from .polygon import METERS_PER_DEGREE, haversine, points_in_polygon
+
+
+class CoverSamples:
+    """
+    Regular lat/lon grid of points inside the region, used to measure coverage
+    Attributes: \n
+        `lat:` np.ndarray, samples inside the polygon \n
+        `lon:` np.ndarray \n
+        `area:` np.ndarray, m2 represented by each sample \n
+    """
+
+    def __init__(self, polygon: np.ndarray, step: float):
+        """
+        :param polygon: (V, 2) lon, lat vertices
+        :param step: sample spacing in meters
+        """
+        lon_min, lat_min = polygon.min(axis=0)
+        lon_max, lat_max = polygon.max(axis=0)
+        self.step = step
+        self.dlat = step / METERS_PER_DEGREE
+        # constant longitude step, measured at the latitude closest to the equator
+        # so no cell is wider than `step` (the coverage margin assumes it)
+        closest = min(abs(lat_min), abs(lat_max)) if lat_min * lat_max > 0 else 0.0
+        self.dlon = step / (METERS_PER_DEGREE * math.cos(math.radians(closest)))
+        self.lat0, self.lon0 = lat_min, lon_min
+        self.rows = int((lat_max - lat_min) / self.dlat) + 2
+        self.cols = int((lon_max - lon_min) / self.dlon) + 2
+
+        grid_lat, grid_lon = np.meshgrid(
+            lat_min + self.dlat * np.arange(self.rows),
+            lon_min + self.dlon * np.arange(self.cols),
+            indexing="ij",
+        )
+        self.inside = points_in_polygon(polygon, grid_lon, grid_lat)
+        # grid position -> sample number (-1 outside the region)
+        self.number = np.full(self.inside.shape, -1, dtype=np.int64)
+        self.number[self.inside] = np.arange(int(self.inside.sum()))
+        self.lat = grid_lat[self.inside]
+        self.lon = grid_lon[self.inside]
+        self.area = (
+            self.dlat * self.dlon * METERS_PER_DEGREE**2 * np.cos(np.radians(self.lat))
+        )
+
+    def covered_by(self, lat: float, lon: float, radius: float) -> np.ndarray:
+        """
+        :return: sample numbers within `radius` meters of the point
+        """
+        dlon = radius / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        dlat = radius / METERS_PER_DEGREE
+        row_0 = max(0, int((lat - dlat - self.lat0) / self.dlat))
+        row_1 = min(self.rows, int((lat + dlat - self.lat0) / self.dlat) + 2)
+        col_0 = max(0, int((lon - dlon - self.lon0) / self.dlon))
+        col_1 = min(self.cols, int((lon + dlon - self.lon0) / self.dlon) + 2)
+        window = self.number[row_0:row_1, col_0:col_1]
+        window = window[window >= 0]
+        distance = haversine(lat, lon, self.lat[window], self.lon[window])
+        return window[distance <= radius]
+
+
+def hexagonal_centers(polygon: np.ndarray, radius: float) -> List[Tuple[float, float]]:
+    """
+    Centers of a hexagonal packing of circles of `radius` meters over the polygon
+    bounding box (plus one radius margin). Rows are 1.5 r apart and centers of a
+    row sqrt(3) r apart, the longitude step follows the latitude of each row.
+    """
+    lon_min, lat_min = polygon.min(axis=0)
+    lon_max, lat_max = polygon.max(axis=0)
+    # 2% slack absorbs the longitude step change between neighbour rows
+    spacing = radius * 0.98
+    dlat = 1.5 * spacing / METERS_PER_DEGREE
+    margin_lat = radius / METERS_PER_DEGREE
+
+    centers = []
+    lat = lat_min - margin_lat
+    row = 0
+    while lat <= lat_max + margin_lat:
+        meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(lat))
+        dlon = math.sqrt(3) * spacing / meters_per_lon
+        margin_lon = radius / meters_per_lon
+        lon = lon_min - margin_lon + (dlon / 2 if row % 2 else 0.0)
+        while lon <= lon_max + margin_lon:
+            centers.append((lat, lon))
+            lon += dlon
+        lat += dlat
+        row += 1
+    return centers
+
+
+def greedy_cover(
+    candidates: List[Tuple[float, float]], radius: float, samples: CoverSamples
+) -> List[Tuple[float, float]]:
+    """
+    Greedy set cover: repeatedly keeps the candidate covering most of the still
+    uncovered samples (lazy evaluation, gains can only decrease)
+    """
+    covers = [samples.covered_by(lat, lon, radius) for lat, lon in candidates]
+    uncovered = np.ones(len(samples.lat), dtype=bool)
+    heap = [(-len(cover), idx) for idx, cover in enumerate(covers) if len(cover)]
+    heapq.heapify(heap)
+    chosen = []
+    while heap and uncovered.any():
+        gain, idx = heapq.heappop(heap)
+        current = int(uncovered[covers[idx]].sum())
+        if current == 0:
+            continue
+        if heap and current < -heap[0][0]:
+            heapq.heappush(heap, (-current, idx))
+            continue
+        chosen.append(idx)
+        uncovered[covers[idx]] = False
+    return [candidates[idx] for idx in sorted(chosen)]
+
+
+def cover_stats(
+    lat: np.ndarray, lon: np.ndarray, radius: np.ndarray, samples: CoverSamples
+) -> Dict[str, float]:
+    """
+    :return: circles, coverage (area share of the region inside a circle),
+        mean_multiplicity (circles over each covered point) and area_ratio
+        (circle area / region area)
+    """
+    count = np.zeros(len(samples.lat), dtype=np.int64)
+    for center_lat, center_lon, center_radius in zip(lat, lon, radius):
+        count[samples.covered_by(center_lat, center_lon, center_radius)] += 1
+    region_area = samples.area.sum()
+    covered = count > 0
+    return {
+        "circles": int(len(lat)),
+        "coverage": float(samples.area[covered].sum() / region_area),
+        "mean_multiplicity": float(
+            (count[covered] * samples.area[covered]).sum() / samples.area[covered].sum()
+        ),
+        "area_ratio": float((np.pi * np.asarray(radius) ** 2).sum() / region_area),
+    }
+
+
+def calculate_and_save_cover(
+    model_name: str, radius: float, sample_step: float = 0.0
+) -> Dict[str, float]:
+    """
+    Near-minimal circle cover of the boundary polygon, saved in the centroids
+    file format (lat,lon,radius)
+    :param radius: search radius in meters
+    :param sample_step: coverage sample spacing in meters, radius / 20 by default
+    :return: cover_stats of the new centroids
+    """
+    polygon = np.array(get_coordinates_from_file(model_name))
+    samples = CoverSamples(polygon, sample_step or radius / 20)
+    # a sample only counts as covered when its whole grid cell is inside the
+    # circle, so the gaps between samples are covered too
+    reach = radius - samples.step / math.sqrt(2)
+    centers = greedy_cover(hexagonal_centers(polygon, reach), reach, samples)
+
+    lat = np.array([center[0] for center in centers])
+    lon = np.array([center[1] for center in centers])
+    radii = np.full(len(centers), float(radius))
+    lines = [
+        f"{center_lat},{center_lon},{radius}\n"
+        for center_lat, center_lon, radius in zip(
+            lat.tolist(), lon.tolist(), radii.tolist()
+        )
+    ]
+    filename = os.path.join(maps_folder, "centroids", f"centroids_{model_name}.txt")
+    with open(filename, "w") as file:
+        file.write("".join(lines))
+    return cover_stats(lat, lon, radii, samples)
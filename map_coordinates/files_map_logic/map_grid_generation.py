@@ -1,16 +1,17 @@
 import numpy as np
-import gmsh
 import warnings
 import os
 from typing import List
 
 warnings.filterwarnings("ignore")
 absolute_path = os.path.dirname(__file__)
+# map_coordinates/ folder, paths do not depend on the working directory
+maps_folder = os.path.dirname(os.path.abspath(absolute_path))
 
 
 def get_coordinates_from_file(model_name: str) -> List[List[float]]:
     coordinates = []
-    boundaries_filename = f"map_coordinates/boundaries/{model_name}.txt"
+    boundaries_filename = os.path.join(maps_folder, "boundaries", f"{model_name}.txt")
     with open(boundaries_filename, "r") as file:
         for line in file:
             lat, lon = line.strip().split(",")
@@ -18,14 +19,20 @@ def get_coordinates_from_file(model_name: str) -> List[List[float]]:
     return coordinates
 
 
-def mesh_generation_file(model_name: str, size_element: float) -> None:
+def mesh_generation_file(
+    model_name: str, size_element: float, show_gui: bool = False
+) -> None:
     """
     Generation of the mesh file
     :param size_element:
     :param model_name:
+    :param show_gui: opens the gmsh window with the mesh, blocks until it is closed
     :return:
     """
-    filename = f"map_coordinates/msh_files/{model_name}.msh"
+    # gmsh is only needed to build meshes, reading a boundary does not load it
+    import gmsh
+
+    filename = os.path.join(maps_folder, "msh_files", f"{model_name}.msh")
     geom_points = get_coordinates_from_file(model_name)
 
     gmsh.initialize()
@@ -74,5 +81,6 @@ def mesh_generation_file(model_name: str, size_element: float) -> None:
     gmsh.option.setNumber("Mesh.SurfaceFaces", 1)  # show FE faces
 
     gmsh.write(filename)
-    gmsh.fltk.run()
+    if show_gui:
+        gmsh.fltk.run()
     gmsh.finalize()
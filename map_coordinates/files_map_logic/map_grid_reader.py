@@ -1,10 +1,18 @@
+import os
 import numpy as np
-import matplotlib
+from .map_grid_generation import maps_folder
+from .object_bases import (
+    Curves,
+    GeometryBase,
+    MeshingBase,
+    PhysicalEntitiesBase,
+    Points,
+    Surfaces,
+    csr_from_lists,
+)
 
-matplotlib.use("Agg")  # Use the non-GUI Agg backend
-import matplotlib.pyplot as plt
-from files_map_logic.object_bases import PhysicalEntitiesBase, GeometryBase, MeshingBase
-import math
+# nodes per element for the gmsh element types  (http://gmsh.info/doc/texinfo/gmsh.html)
+NODES_PER_ELEMENT = {1: 2, 2: 3, 3: 4, 4: 4, 5: 8, 6: 6, 7: 5, 8: 3, 9: 6, 15: 1}
 
 
 class Mesh:
@@ -17,6 +25,25 @@ class Mesh:
         self.geometry = GeometryBase()
         self.meshing = MeshingBase()
 
+    @classmethod
+    def from_cache(cls, model_name: str) -> "Mesh":
+        """
+        Nodes and quads of `msh_files/{model_name}.msh` from the memory mapped
+        binary copy of mesh_cache, the .msh is only parsed when it changed. The
+        geometry, physical entities and node entity columns are left empty.
+        """
+        from .mesh_cache import load_mesh_arrays
+
+        arrays = load_mesh_arrays(model_name)
+        mesh = cls()
+        meshing = mesh.meshing = MeshingBase(len(arrays["node_tags"]))
+        meshing.nodes_entities_tag[:, 0] = arrays["node_tags"]
+        meshing.nodes_coord = arrays["nodes_coord"]
+        meshing.elements_connection = arrays["elements_connection"]
+        meshing.elements_number = len(meshing.elements_connection)
+        meshing.index_nodes()
+        return mesh
+
     def read_gmsh_file(self, file, dim=2):
         """
         how to read the msh file here -->  http://gmsh.info/dev/doc/texinfo/gmsh.pdf
@@ -27,25 +54,26 @@ class Mesh:
         :return: mesh object
         """
         with open(file) as input_file:
-            read_file = input_file.readlines()
-            read_file = [line.rstrip("\n") for line in read_file]
+            content = input_file.read()
 
-            # --- splitting the file ---
-            physical_idx, entities_idx, nodes_idx, elements_idx = Mesh._splitting_file(
-                read_file
-            )
+        # the small header sections are parsed line by line, the bulk
+        # $Nodes / $Elements sections are converted straight into arrays
+        read_file = content[: content.index("$Nodes")].splitlines()
+
+        # --- splitting the file ---
+        physical_idx, entities_idx = Mesh._splitting_file(read_file)
 
-            # --- physical entities ---
-            Mesh._physical_entities(self, read_file, physical_idx)
+        # --- physical entities ---
+        Mesh._physical_entities(self, read_file, physical_idx)
 
-            # --- Entities ---
-            Mesh._entities(self, read_file, entities_idx)
+        # --- Entities ---
+        Mesh._entities(self, read_file, entities_idx)
 
-            # --- Nodes ---
-            Mesh._nodes(self, read_file, nodes_idx)
+        # --- Nodes ---
+        Mesh._nodes(self, Mesh._section(content, "$Nodes", "$EndNodes"))
 
-            # --- Elements ---
-            Mesh._elements(self, read_file, elements_idx)
+        # --- Elements ---
+        Mesh._elements(self, Mesh._section(content, "$Elements", "$EndElements"))
 
         return self
 
@@ -59,40 +87,36 @@ class Mesh:
             read_file.index("$Entities"),
             read_file.index("$EndEntities"),
         ]
-        nodes_idx = [read_file.index("$Nodes"), read_file.index("$EndNodes")]
-        elements_idx = [
-            read_file.index("$Elements"),
-            read_file.index("$EndElements"),
-        ]
 
-        return physical_idx, entities_idx, nodes_idx, elements_idx
+        return physical_idx, entities_idx
+
+    @staticmethod
+    def _section(content, start_tag, end_tag):
+        start = content.index(start_tag) + len(start_tag)
+        return content[start : content.index(end_tag, start)]
 
     def _physical_entities(self, read_file, physical_idx):
         total_physical_entities = int(read_file[physical_idx[0] + 1])
+        contour_idxs, contour_tag = [], []
+        surface_idxs, surface_tag = [], []
         for idx in range(total_physical_entities):
             read_line = read_file[physical_idx[0] + 2 + idx].split(" ")
             # lines
             if int(read_line[0]) == 1:
-                self.physical_entities.contour_idxs.append(int(read_line[1]))
-                self.physical_entities.contour_tag.append(read_line[2].replace('"', ""))
+                contour_idxs.append(int(read_line[1]))
+                contour_tag.append(read_line[2].replace('"', ""))
             # surfaces
             else:
-                self.physical_entities.surface_idxs.append(int(read_line[1]))
-                self.physical_entities.surface_tag.append(read_line[2])
-
-        self.physical_entities.contours_number = len(
-            self.physical_entities.contour_idxs
-        )
-        self.physical_entities.surfaces_number = len(
-            self.physical_entities.surface_idxs
-        )
-
-        self.physical_entities.contour_idxs = np.array(
-            self.physical_entities.contour_idxs
-        )
-        self.physical_entities.contour_tag = np.array(
-            self.physical_entities.contour_tag
-        )
+                surface_idxs.append(int(read_line[1]))
+                surface_tag.append(read_line[2])
+
+        physical_entities = self.physical_entities
+        physical_entities.contours_number = len(contour_idxs)
+        physical_entities.surfaces_number = len(surface_idxs)
+        physical_entities.contour_idxs = np.array(contour_idxs, dtype=np.int64)
+        physical_entities.contour_tag = np.array(contour_tag, dtype=str)
+        physical_entities.surface_idxs = np.array(surface_idxs, dtype=np.int64)
+        physical_entities.surface_tag = np.array(surface_tag, dtype=str)
         return self
 
     def _entities(self, read_file, entities_idx):
@@ -100,143 +124,142 @@ class Mesh:
         n_points = int(entities[0])
         n_curves = int(entities[1])
         n_surfaces = int(entities[2])
-        self.geometry.points.points_number = n_points
-        self.geometry.curves.curves_number = n_curves
-        self.geometry.surfaces.surfaces_number = n_surfaces
+        points = self.geometry.points = Points(n_points)
+        curves = self.geometry.curves = Curves(n_curves)
+        surfaces = self.geometry.surfaces = Surfaces(n_surfaces)
 
+        first_line = entities_idx[0] + 2
         for idx in range(n_points):
-            read_line = read_file[entities_idx[0] + 2 + idx].split(" ")
-            self.geometry.points.point.append(int(read_line[0]))
-            self.geometry.points.point_coord.append(
-                list(map(float, [read_line[1], read_line[2]]))
-            )
-        self.geometry.points.point = np.array(self.geometry.points.point)
-        self.geometry.points.point_coord = np.array(self.geometry.points.point_coord)
+            read_line = read_file[first_line + idx].split(" ")
+            points.point[idx] = int(read_line[0])
+            points.point_coord[idx] = float(read_line[1]), float(read_line[2])
 
+        first_line += n_points
+        physical_tags, bounding_curves = [], []
         for idx in range(n_curves):
-            read_line = read_file[entities_idx[0] + 2 + idx + n_points].split(" ")
-            self.geometry.curves.curve_tag.append(int(read_line[0]))
-            self.geometry.curves.curve_coord.append(
-                list(map(float, [coord for coord in read_line[1:7]]))
-            )
-
-            count_physical = int(read_line[7])
-            self.geometry.curves.physical_tags_number.append(count_physical)
-            self.geometry.curves.physical_tags.append(
-                list(map(int, (tag for tag in read_line[8 : 8 + count_physical])))
-            )
-
-            count = int(read_line[8 + count_physical])
-            self.geometry.curves.bounding_curves_number.append(count)
-            self.geometry.curves.bounding_curves.append(
-                list(map(int, [curve for curve in read_line[10 : 10 + count]]))
-            )
-        self.geometry.curves.curve_tag = np.array(self.geometry.curves.curve_tag)
-        self.geometry.curves.curve_coord = np.array(self.geometry.curves.curve_coord)
-        self.geometry.curves.physical_tags_number = np.array(
-            self.geometry.curves.physical_tags_number
+            read_line = read_file[first_line + idx].split(" ")
+            curves.curve_tag[idx] = int(read_line[0])
+            curves.curve_coord[idx] = [float(coord) for coord in read_line[1:7]]
+            tags, bounding = Mesh._tag_lists(read_line)
+            physical_tags.append(tags)
+            bounding_curves.append(bounding)
+        curves.physical_tags, curves.physical_tags_offsets = csr_from_lists(
+            physical_tags
         )
-        self.geometry.curves.physical_tags = np.array(
-            self.geometry.curves.physical_tags
+        curves.bounding_curves, curves.bounding_curves_offsets = csr_from_lists(
+            bounding_curves
         )
+        curves.physical_tags_number = np.diff(curves.physical_tags_offsets)
+        curves.bounding_curves_number = np.diff(curves.bounding_curves_offsets)
 
+        first_line += n_curves
+        physical_tags, curves_tags = [], []
         for idx in range(n_surfaces):
-            read_line = read_file[
-                entities_idx[0] + 2 + idx + n_points + n_curves
-            ].split(" ")
-            self.geometry.surfaces.surfaces_tag.append(int(read_line[0]))
-            self.geometry.surfaces.surfaces_coord.append(
-                list(map(float, [coord for coord in read_line[1:7]]))
-            )
-
-            count_physical = int(read_line[7])
-            self.geometry.surfaces.physical_tags_number.append(count_physical)
-            self.geometry.surfaces.physical_tags.append(
-                list(map(int, (tag for tag in read_line[8 : 8 + count_physical])))
-            )
-            count = int(read_line[8 + count_physical])
-            self.geometry.surfaces.bounding_curves_number.append(count)
-            self.geometry.surfaces.curves_tags.append(
-                list(map(int, [tag for tag in read_line[10 : 10 + count]]))
-            )
+            read_line = read_file[first_line + idx].split(" ")
+            surfaces.surfaces_tag[idx] = int(read_line[0])
+            surfaces.surfaces_coord[idx] = [float(coord) for coord in read_line[1:7]]
+            tags, bounding = Mesh._tag_lists(read_line)
+            physical_tags.append(tags)
+            curves_tags.append(bounding)
+        surfaces.physical_tags, surfaces.physical_tags_offsets = csr_from_lists(
+            physical_tags
+        )
+        surfaces.curves_tags, surfaces.curves_tags_offsets = csr_from_lists(curves_tags)
+        surfaces.physical_tags_number = np.diff(surfaces.physical_tags_offsets)
+        surfaces.bounding_curves_number = np.diff(surfaces.curves_tags_offsets)
         return self
 
-    def _nodes(self, read_file, nodes_idx):
-        read_line = read_file[nodes_idx[0] + 1].split(" ")
-        self.meshing.nodes_number = int(read_line[3])
-        idx = nodes_idx[0] + 1
-        while idx < nodes_idx[1] - 1:
-            read_line = read_file[idx + 1].split(" ")
-            entity_dim = int(read_line[0])
-            entity_tag = int(read_line[1])
-            nodes_in_block = int(read_line[3])
-
-            initial = idx + 2
-            end = initial + nodes_in_block
-            node_tags = read_file[initial:end]
-            node_coords = read_file[end : end + nodes_in_block]
-
-            for tag in node_tags:
-                # node_id, entity_dimension, entity_id
-                self.meshing.nodes_entities_tag.append(
-                    [int(tag), entity_dim, entity_tag]
-                )
-
-            for coord in node_coords:
-                coordinate = coord.split(" ")
-                self.meshing.nodes_coord.append(
-                    list(map(float, [value for value in coordinate]))
-                )
-            idx = end + nodes_in_block - 1
-        self.meshing.nodes_entities_tag = np.array(self.meshing.nodes_entities_tag)
-        self.meshing.nodes_coord = np.array(self.meshing.nodes_coord)
+    @staticmethod
+    def _tag_lists(read_line):
+        # tag, bounding box (6), numPhysicalTags, physicalTags...,
+        # numBoundingEntities, boundingTags...
+        count_physical = int(read_line[7])
+        physical_tags = [int(tag) for tag in read_line[8 : 8 + count_physical]]
+        count = int(read_line[8 + count_physical])
+        start = 9 + count_physical
+        return physical_tags, [int(tag) for tag in read_line[start : start + count]]
+
+    def _nodes(self, section):
+        # header: numEntityBlocks numNodes minNodeTag maxNodeTag
+        # block:  entityDim entityTag parametric numNodesInBlock, tags, then x y z
+        values = np.fromstring(section, dtype=np.float64, sep=" ")
+        blocks_number = int(values[0])
+        # preallocated from numNodes, the node tags need not be contiguous
+        meshing = self.meshing = MeshingBase(int(values[1]))
+        nodes_entities_tag = meshing.nodes_entities_tag
+        nodes_coord = meshing.nodes_coord
+        position = 4
+        row = 0
+        for _ in range(blocks_number):
+            entity_dim, entity_tag, parametric, nodes_in_block = values[
+                position : position + 4
+            ].astype(int)
+            position += 4
+            end = row + nodes_in_block
+
+            nodes_entities_tag[row:end, 0] = values[
+                position : position + nodes_in_block
+            ]
+            nodes_entities_tag[row:end, 1] = entity_dim
+            nodes_entities_tag[row:end, 2] = entity_tag
+            position += nodes_in_block
+
+            # parametric nodes carry entity_dim extra (u, v) values per node
+            width = 3 + (entity_dim if parametric else 0)
+            coords = values[position : position + nodes_in_block * width]
+            nodes_coord[row:end] = coords.reshape(nodes_in_block, width)[:, :3]
+            position += nodes_in_block * width
+            row = end
+
+        meshing.index_nodes()
         return self
 
-    def _elements(self, read_file, elements_idx):
-        read_line = read_file[elements_idx[0] + 1].split(" ")
-        self.meshing.elements_number = int(read_line[1])
-        idx = 1
-        while idx < self.meshing.elements_number - 1:
-            read_line = read_file[elements_idx[0] + 1 + idx].split(" ")
-            entity_dim = int(read_line[0])
-            entity_tag = int(read_line[1])
-            element_type = int(read_line[2])
-            elements_in_block = int(read_line[3])
-
-            # only use the 2D elements
-            if element_type != 3:
-                idx += elements_in_block + 1
-                continue
-
-            initial = elements_idx[0] + 2 + idx
-            end = initial + elements_in_block
-            elements_tags = read_file[initial:end]
-
-            for element in elements_tags:
-                nodes = element.split(" ", maxsplit=4)
-                self.meshing.elements_connection.append(
-                    list(map(int, [node.strip() for node in nodes]))
-                )
-            idx += elements_in_block + 1
-        self.meshing.elements_number = len(self.meshing.elements_connection)
-        self.meshing.elements_connection = np.array(self.meshing.elements_connection)
+    def _elements(self, section, element_type=3):
+        # header: numEntityBlocks numElements minElementTag maxElementTag
+        # block:  entityDim entityTag elementType numElementsInBlock, then
+        #         elementTag nodeTag ... per element
+        values = np.fromstring(section, dtype=np.int64, sep=" ")
+        blocks_number = int(values[0])
+
+        blocks = []
+        position = 4
+        for _ in range(blocks_number):
+            block_type = int(values[position + 2])
+            elements_in_block = int(values[position + 3])
+            position += 4
+            width = 1 + NODES_PER_ELEMENT[block_type]
+            end = position + elements_in_block * width
+            # only use the 2D elements (4-node quadrangles)
+            if block_type == element_type:
+                blocks.append(values[position:end].reshape(elements_in_block, width))
+            position = end
+
+        if blocks:
+            elements_connection = np.concatenate(blocks)
+        else:
+            elements_connection = np.empty(
+                (0, 1 + NODES_PER_ELEMENT[element_type]), dtype=np.int64
+            )
+        self.meshing.elements_number = len(elements_connection)
+        self.meshing.elements_connection = elements_connection
         return self
 
     @staticmethod
-    def _calculate_radius_from_degrees(
-        lat1: float, lon1: float, lat2: float, lon2: float
-    ) -> float:
-        lat_1, lon_1, lat_2, lon_2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    def _calculate_radius_from_degrees(lat1, lon1, lat2, lon2):
+        """
+        Haversine distance (x1.1 safety factor), accepts floats or numpy arrays
+        """
+        lat_1, lon_1, lat_2, lon_2 = map(np.radians, [lat1, lon1, lat2, lon2])
         dlat = lat_2 - lat_1
         dlon = lon_2 - lon_1
 
         # Haversine formula
         R = 6371.0 * 1000  # earth radius
         a = (
-            math.sin(dlat / 2) ** 2
-            + math.cos(lat_1) * math.cos(lat_2) * math.sin(dlon / 2) ** 2
+            np.sin(dlat / 2) ** 2
+            + np.cos(lat_1) * np.cos(lat_2) * np.sin(dlon / 2) ** 2
         )
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
         # Distance in meters
         distance = (R * c) * 1.1
@@ -245,19 +268,68 @@ class Mesh:
     def calculate_and_save_centroids(self, model_name: str):
         # lat = coords[1]
         # lon = coords[0]
-        coords = np.array(self.meshing.nodes_coord)
-
-        with open(f"map_coordinates/centroids/centroids_{model_name}.txt", "w") as file:
-            for element in self.meshing.elements_connection:
-                lon_center = np.mean(coords[element[1:5] - 1, 0], axis=0)
-                lat_center = np.mean(coords[element[1:5] - 1, 1], axis=0)
-
-                radius = Mesh._calculate_radius_from_degrees(
-                    lat1=lat_center,
-                    lon1=lon_center,
-                    lat2=coords[element[1] - 1, 1],
-                    lon2=coords[element[1] - 1, 0],
-                )
-                file.write(str(lat_center) + ",")
-                file.write(str(lon_center) + ",")
-                file.write(str(radius) + "\n")
+        # (elements, 4 nodes, xyz) gathered in one shot through the node tag index
+        quad_coords = self.meshing.element_nodes_coord()
+        lon_center = quad_coords[:, :, 0].mean(axis=1)
+        lat_center = quad_coords[:, :, 1].mean(axis=1)
+
+        radius = Mesh._calculate_radius_from_degrees(
+            lat1=lat_center,
+            lon1=lon_center,
+            lat2=quad_coords[:, 0, 1],
+            lon2=quad_coords[:, 0, 0],
+        )
+        lines = [
+            f"{lat},{lon},{r}\n"
+            for lat, lon, r in zip(
+                lat_center.tolist(), lon_center.tolist(), radius.tolist()
+            )
+        ]
+        filename = os.path.join(maps_folder, "centroids", f"centroids_{model_name}.txt")
+        with open(filename, "w") as file:
+            file.write("".join(lines))
+
+
+def save_density_map(
+    lat,
+    lon,
+    values,
+    filename: str,
+    title: str = "",
+    label: str = "",
+    boundary=None,
+    dropped=None,
+):
+    """
+    PNG map of a value per centroid
+    :param boundary: (n, 2) lon, lat outline drawn under the centroids
+    :param dropped: bool mask of the centroids drawn as gray crosses
+    """
+    # matplotlib is only loaded by the plots, reading a mesh does not need it
+    import matplotlib
+
+    matplotlib.use("Agg")  # Use the non-GUI Agg backend
+    import matplotlib.pyplot as plt
+
+    lat, lon, values = np.asarray(lat), np.asarray(lon), np.asarray(values)
+    drawn = np.ones(len(values), dtype=bool) if dropped is None else ~dropped
+    fig, ax = plt.subplots(figsize=(8, 8))
+    if boundary is not None:
+        boundary = np.asarray(boundary)
+        boundary = np.vstack([boundary, boundary[:1]])
+        ax.plot(boundary[:, 0], boundary[:, 1], color="gray", linewidth=0.8)
+    points = ax.scatter(
+        lon[drawn], lat[drawn], c=values[drawn], s=12, cmap="inferno", marker="s"
+    )
+    if dropped is not None and dropped.any():
+        ax.scatter(
+            lon[dropped], lat[dropped], color="lightgray", s=10, marker="x", zorder=0
+        )
+    fig.colorbar(points, ax=ax, label=label, shrink=0.8)
+    # degrees of longitude shrink with the latitude
+    ax.set_aspect(1 / np.cos(np.radians(lat.mean())) if len(lat) else 1)
+    ax.set_xlabel("longitude")
+    ax.set_ylabel("latitude")
+    ax.set_title(title)
+    fig.savefig(filename, dpi=150, bbox_inches="tight")
+    plt.close(fig)
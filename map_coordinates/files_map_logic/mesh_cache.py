@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Dict, Optional
+
+# map_coordinates/ folder, the same as map_grid_generation.maps_folder without
+# importing the mesh generation module into every crawl
+maps_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cache_folder = os.path.join(maps_folder, "cache")
+
+
+def _sources(model_name: str) -> Dict[str, str]:
+    return {
+        "msh": os.path.join(maps_folder, "msh_files", f"{model_name}.msh"),
+        "boundary": os.path.join(maps_folder, "boundaries", f"{model_name}.txt"),
+        "centroids": os.path.join(
+            maps_folder, "centroids", f"centroids_{model_name}.txt"
+        ),
+    }
+
+
+def _fingerprint(path: str) -> Optional[list]:
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_manifest(folder: str) -> dict:
+    try:
+        with open(os.path.join(folder, "sources.json"), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_arrays(folder: str, arrays: Dict[str, np.ndarray], manifest: dict) -> None:
+    # write to unique temporary files first, readers never see a half written
+    # array and concurrent writers (shard processes) never share a file
+    os.makedirs(folder, exist_ok=True)
+    for name, array in arrays.items():
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f"{name}.", suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            np.save(file, np.ascontiguousarray(array))
+        os.replace(tmp_path, os.path.join(folder, f"{name}.npy"))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix="sources.", suffix=".tmp")
+    with os.fdopen(fd, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, os.path.join(folder, "sources.json"))
+
+
+def _load_arrays(folder: str, names) -> Dict[str, np.ndarray]:
+    return {
+        name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+        for name in names
+    }
+
+
+def load_mesh_arrays(model_name: str) -> Dict[str, np.ndarray]:
+    """
+    Node coordinates and quad connectivity of the mesh as read-only memory maps,
+    the binary copy is rebuilt only when the .msh or boundary file changed. The
+    connectivity holds node tags, `node_tags` gives the tag of each node row.
+    :return: {"nodes_coord": (N, 3) float, "node_tags": (N,) int,
+        "elements_connection": (E, 5) int}
+    """
+    folder = os.path.join(cache_folder, model_name)
+    sources = _sources(model_name)
+    manifest = _read_manifest(folder)
+    current = {
+        "msh": _fingerprint(sources["msh"]),
+        "boundary": _fingerprint(sources["boundary"]),
+    }
+    names = ("nodes_coord", "node_tags", "elements_connection")
+    # copies made before node_tags was cached are rebuilt
+    current["arrays"] = list(names)
+    if manifest.get("mesh") != current:
+        from .map_grid_reader import Mesh
+
+        mesh = Mesh().read_gmsh_file(sources["msh"])
+        manifest["mesh"] = current
+        _write_arrays(
+            folder,
+            {
+                "nodes_coord": mesh.meshing.nodes_coord,
+                "node_tags": mesh.meshing.nodes_entities_tag[:, 0],
+                "elements_connection": mesh.meshing.elements_connection,
+            },
+            manifest,
+        )
+    return _load_arrays(folder, names)
+
+
+def load_centroids(model_name: str) -> np.ndarray:
+    """
+    Centroids as a read-only (C, 3) memory map of lat, lon, radius, the binary
+    copy is rebuilt only when the centroids file changed
+    """
+    folder = os.path.join(cache_folder, model_name)
+    sources = _sources(model_name)
+    manifest = _read_manifest(folder)
+    current = {"centroids": _fingerprint(sources["centroids"])}
+    if manifest.get("centroids") != current:
+        centroids = np.loadtxt(
+            sources["centroids"], delimiter=",", dtype=np.float64, ndmin=2
+        )
+        manifest["centroids"] = current
+        _write_arrays(folder, {"centroids": centroids}, manifest)
+    return _load_arrays(folder, ("centroids",))["centroids"]
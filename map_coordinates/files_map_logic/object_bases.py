@@ -1,90 +1,176 @@
-from typing import List
+import numpy as np
+from typing import Iterable, List, Optional, Tuple
+
+# a dense node tag -> row table is used while the tag range is at most this many
+# times the node count, sparser numberings fall back to a sorted search
+DENSE_INDEX_RATIO = 4
+
+
+def csr_from_lists(rows: Iterable[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Flat values and offsets of variable length rows, row i is
+    values[offsets[i]:offsets[i + 1]]
+    """
+    rows = list(rows)
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=offsets[1:])
+    values = np.fromiter(
+        (value for row in rows for value in row), dtype=np.int64, count=int(offsets[-1])
+    )
+    return values, offsets
 
 
 class Points:
     """
     Attributes: \n
         `points_number:` int \n
-        `point:` List[int] \n
-        `point_coord:` List[List[float]] \n
+        `point:` np.ndarray, (n,) point tags \n
+        `point_coord:` np.ndarray, (n, 2) x, y \n
     Methods: \n
-        `__init__():`
+        `__init__():` preallocates `points_number` rows
     """
 
-    def __init__(self):
-        self.points_number: int = 0
-        self.point: List[int] = []
-        self.point_coord: List[List[float]] = []
+    __slots__ = ("points_number", "point", "point_coord")
+
+    def __init__(self, points_number: int = 0):
+        self.points_number: int = points_number
+        self.point = np.zeros(points_number, dtype=np.int64)
+        self.point_coord = np.zeros((points_number, 2), dtype=np.float64)
 
 
 class Curves:
     """
+    Variable length tag lists are stored CSR style: a flat array plus an
+    (n + 1,) offsets array
     Attributes: \n
         `curves_number:` int
-        `curve_tag:` List[int] \n
-        `curve_coord:` \n
-        `physical_tags_number:` List[int] \n
-        `physical_tags:` List[int] \n
-        `bounding_curves_number:` List[int] \n
-        `bounding_curves:` List[int] \n
+        `curve_tag:` np.ndarray, (n,) \n
+        `curve_coord:` np.ndarray, (n, 6) bounding box \n
+        `physical_tags_number:` np.ndarray, (n,) \n
+        `physical_tags:` np.ndarray, flat \n
+        `physical_tags_offsets:` np.ndarray, (n + 1,) \n
+        `bounding_curves_number:` np.ndarray, (n,) \n
+        `bounding_curves:` np.ndarray, flat, signed bounding point tags \n
+        `bounding_curves_offsets:` np.ndarray, (n + 1,) \n
     Methods: \n
-        `__init__():`
+        `__init__():` preallocates `curves_number` rows \n
+        `physical_tags_of():` physical tags of a row \n
+        `bounding_curves_of():` bounding tags of a row
     """
 
-    def __init__(self):
-        self.curves_number: int = 0
-        self.curve_tag: List[int] = []
-        self.curve_coord: List[List[float]] = []
-        self.physical_tags_number: List[int] = []
-        self.physical_tags: List[int] = []
-        self.bounding_curves_number: List[int] = []
-        self.bounding_curves: List[int] = []
+    __slots__ = (
+        "curves_number",
+        "curve_tag",
+        "curve_coord",
+        "physical_tags_number",
+        "physical_tags",
+        "physical_tags_offsets",
+        "bounding_curves_number",
+        "bounding_curves",
+        "bounding_curves_offsets",
+    )
+
+    def __init__(self, curves_number: int = 0):
+        self.curves_number: int = curves_number
+        self.curve_tag = np.zeros(curves_number, dtype=np.int64)
+        self.curve_coord = np.zeros((curves_number, 6), dtype=np.float64)
+        self.physical_tags_number = np.zeros(curves_number, dtype=np.int64)
+        self.physical_tags = np.zeros(0, dtype=np.int64)
+        self.physical_tags_offsets = np.zeros(curves_number + 1, dtype=np.int64)
+        self.bounding_curves_number = np.zeros(curves_number, dtype=np.int64)
+        self.bounding_curves = np.zeros(0, dtype=np.int64)
+        self.bounding_curves_offsets = np.zeros(curves_number + 1, dtype=np.int64)
+
+    def physical_tags_of(self, row: int) -> np.ndarray:
+        offsets = self.physical_tags_offsets
+        return self.physical_tags[offsets[row] : offsets[row + 1]]
+
+    def bounding_curves_of(self, row: int) -> np.ndarray:
+        offsets = self.bounding_curves_offsets
+        return self.bounding_curves[offsets[row] : offsets[row + 1]]
 
 
 class Surfaces:
     """
+    Variable length tag lists are stored CSR style: a flat array plus an
+    (n + 1,) offsets array
     Attributes: \n
         `surfaces_number:` int \n
-        `surfaces_tag:` List[int] \n
-        `surfaces_coord:` List[List[float]] \n
-        `physical_tags_number:` List[int] \n
-        `physical_tags:` List[int] \n
-        `bounding_curves_number:` List[int] \n
-        `curves_tags:` List[int] \n
+        `surfaces_tag:` np.ndarray, (n,) \n
+        `surfaces_coord:` np.ndarray, (n, 6) bounding box \n
+        `physical_tags_number:` np.ndarray, (n,) \n
+        `physical_tags:` np.ndarray, flat \n
+        `physical_tags_offsets:` np.ndarray, (n + 1,) \n
+        `bounding_curves_number:` np.ndarray, (n,) \n
+        `curves_tags:` np.ndarray, flat, signed bounding curve tags \n
+        `curves_tags_offsets:` np.ndarray, (n + 1,) \n
     Methods: \n
-        `__init__():`
+        `__init__():` preallocates `surfaces_number` rows \n
+        `physical_tags_of():` physical tags of a row \n
+        `curves_tags_of():` bounding curve tags of a row
     """
 
-    def __init__(self):
-        self.surfaces_number: int = 0
-        self.surfaces_tag: List[int] = []
-        self.surfaces_coord: List[List[float]] = []
-        self.physical_tags_number: List[int] = []
-        self.physical_tags: List[int] = []
-        self.bounding_curves_number: List[int] = []
-        self.curves_tags: List[int] = []
+    __slots__ = (
+        "surfaces_number",
+        "surfaces_tag",
+        "surfaces_coord",
+        "physical_tags_number",
+        "physical_tags",
+        "physical_tags_offsets",
+        "bounding_curves_number",
+        "curves_tags",
+        "curves_tags_offsets",
+    )
+
+    def __init__(self, surfaces_number: int = 0):
+        self.surfaces_number: int = surfaces_number
+        self.surfaces_tag = np.zeros(surfaces_number, dtype=np.int64)
+        self.surfaces_coord = np.zeros((surfaces_number, 6), dtype=np.float64)
+        self.physical_tags_number = np.zeros(surfaces_number, dtype=np.int64)
+        self.physical_tags = np.zeros(0, dtype=np.int64)
+        self.physical_tags_offsets = np.zeros(surfaces_number + 1, dtype=np.int64)
+        self.bounding_curves_number = np.zeros(surfaces_number, dtype=np.int64)
+        self.curves_tags = np.zeros(0, dtype=np.int64)
+        self.curves_tags_offsets = np.zeros(surfaces_number + 1, dtype=np.int64)
+
+    def physical_tags_of(self, row: int) -> np.ndarray:
+        offsets = self.physical_tags_offsets
+        return self.physical_tags[offsets[row] : offsets[row + 1]]
+
+    def curves_tags_of(self, row: int) -> np.ndarray:
+        offsets = self.curves_tags_offsets
+        return self.curves_tags[offsets[row] : offsets[row + 1]]
 
 
 class PhysicalEntitiesBase:
     """
     Attributes: \n
         `contours_number:` int \n
-        `contour_idxs:` List[int] \n
-        `contour_tag:` List[int] \n
-        `surface_numbers:` int \n
-        `surface_idxs:` List[int] \n
-        `surface_tag:` List[int] \n
+        `contour_idxs:` np.ndarray \n
+        `contour_tag:` np.ndarray \n
+        `surfaces_number:` int \n
+        `surface_idxs:` np.ndarray \n
+        `surface_tag:` np.ndarray \n
     Methods: \n
         `__init__():`
     """
 
+    __slots__ = (
+        "contours_number",
+        "contour_idxs",
+        "contour_tag",
+        "surfaces_number",
+        "surface_idxs",
+        "surface_tag",
+    )
+
     def __init__(self):
         self.contours_number: int = 0
-        self.contour_idxs: List[int] = []
-        self.contour_tag: List[int] = []
-        self.surface_numbers: int = 0
-        self.surface_idxs: List[int] = []
-        self.surface_tag: List[int] = []
+        self.contour_idxs = np.zeros(0, dtype=np.int64)
+        self.contour_tag = np.zeros(0, dtype=str)
+        self.surfaces_number: int = 0
+        self.surface_idxs = np.zeros(0, dtype=np.int64)
+        self.surface_tag = np.zeros(0, dtype=str)
 
 
 class GeometryBase:
@@ -97,6 +183,8 @@ class GeometryBase:
         `__init__():`
     """
 
+    __slots__ = ("points", "curves", "surfaces")
+
     def __init__(self):
         self.points = Points()
         self.curves = Curves()
@@ -105,19 +193,86 @@ class GeometryBase:
 
 class MeshingBase:
     """
+    Node tags do not have to be contiguous nor 1-based, `node_rows()` maps
+    them to rows of the node arrays
     Attributes: \n
         `nodes_number:` int \n
-        `nodes_entities_tag:` List[int] \n
-        `nodes_coord:` List[List[float]] \n
+        `nodes_entities_tag:` np.ndarray, (N, 3) node tag, entity dim, entity tag \n
+        `nodes_coord:` np.ndarray, (N, 3) x, y, z \n
         `elements_number:` int \n
-        `elements_connection:` List[int] \n
+        `elements_connection:` np.ndarray, (E, 1 + nodes per element) element
+            tag then node tags \n
+        `node_tag_min:` int, tag of row 0 of the dense `node_index` \n
+        `node_index:` np.ndarray, dense tag -> row table (-1 = no node), or the
+            rows sorted by tag for a sparse numbering \n
+        `node_sorted_tags:` Optional[np.ndarray], sorted tags of a sparse numbering \n
     Methods: \n
-        `__init__():`
+        `__init__():` preallocates `nodes_number` nodes \n
+        `index_nodes():` builds the node tag -> row lookup \n
+        `node_rows():` rows of an array of node tags \n
+        `element_nodes_coord():` (E, nodes per element, 3) coordinates
     """
 
-    def __init__(self):
-        self.nodes_number: int = 0
-        self.nodes_entities_tag: List[int] = []
-        self.nodes_coord: List[List[float]] = []
+    __slots__ = (
+        "nodes_number",
+        "nodes_entities_tag",
+        "nodes_coord",
+        "elements_number",
+        "elements_connection",
+        "node_tag_min",
+        "node_index",
+        "node_sorted_tags",
+    )
+
+    def __init__(self, nodes_number: int = 0):
+        self.nodes_number: int = nodes_number
+        self.nodes_entities_tag = np.zeros((nodes_number, 3), dtype=np.int64)
+        self.nodes_coord = np.zeros((nodes_number, 3), dtype=np.float64)
         self.elements_number: int = 0
-        self.elements_connection: List[int] = []
+        self.elements_connection = np.zeros((0, 5), dtype=np.int64)
+        self.node_tag_min: int = 0
+        self.node_index = np.zeros(0, dtype=np.int64)
+        self.node_sorted_tags: Optional[np.ndarray] = None
+
+    def index_nodes(self) -> None:
+        tags = self.nodes_entities_tag[:, 0]
+        self.node_tag_min = 0
+        self.node_sorted_tags = None
+        if not len(tags):
+            self.node_index = np.zeros(0, dtype=np.int64)
+            return
+        low, high = int(tags.min()), int(tags.max())
+        if high - low + 1 <= DENSE_INDEX_RATIO * len(tags):
+            self.node_tag_min = low
+            self.node_index = np.full(high - low + 1, -1, dtype=np.int64)
+            self.node_index[tags - low] = np.arange(len(tags))
+        else:
+            self.node_index = np.argsort(tags, kind="stable")
+            self.node_sorted_tags = tags[self.node_index]
+
+    def node_rows(self, tags) -> np.ndarray:
+        """
+        :param tags: node tags, any shape
+        :return: rows of `nodes_coord` with the same shape
+        """
+        tags = np.asarray(tags, dtype=np.int64)
+        if not tags.size:
+            return np.zeros(tags.shape, dtype=np.int64)
+        if not len(self.node_index):
+            raise ValueError("The mesh has no nodes")
+        if self.node_sorted_tags is None:
+            position = tags - self.node_tag_min
+            known = (position >= 0) & (position < len(self.node_index))
+            rows = self.node_index[np.where(known, position, 0)]
+            rows[~known] = -1
+        else:
+            position = np.searchsorted(self.node_sorted_tags, tags)
+            position = np.minimum(position, len(self.node_sorted_tags) - 1)
+            rows = self.node_index[position]
+            rows[self.node_sorted_tags[position] != tags] = -1
+        if (rows < 0).any():
+            raise ValueError(f"Unknown node tags: {np.unique(tags[rows < 0])[:10]}")
+        return rows
+
+    def element_nodes_coord(self) -> np.ndarray:
+        return self.nodes_coord[self.node_rows(self.elements_connection[:, 1:])]
@@ -0,0 +1,107 @@
+import numpy as np
+from typing import Optional
+
+# meters per degree of latitude
+METERS_PER_DEGREE = 111_320.0
+
+
+def points_in_polygon(polygon: np.ndarray, lon, lat) -> np.ndarray:
+    """
+    Even-odd ray casting, vectorized over the points
+    :param polygon: (V, 2) lon, lat vertices, closed implicitly
+    :return: bool mask
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    inside = np.zeros(lon.shape, dtype=bool)
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    for ax, ay, bx, by in zip(x1, y1, x2, y2):
+        if ay == by:
+            continue
+        crosses = (ay > lat) != (by > lat)
+        x_cross = ax + (lat - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (lon < x_cross)
+    return inside
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in meters, accepts floats or numpy arrays
+    """
+    lat_1, lon_1, lat_2, lon_2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    a = (
+        np.sin((lat_2 - lat_1) / 2) ** 2
+        + np.cos(lat_1) * np.cos(lat_2) * np.sin((lon_2 - lon_1) / 2) ** 2
+    )
+    return 2 * 6371.0 * 1000 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class BoundaryIndex:
+    """
+    Point-in-polygon test of a region boundary accelerated by latitude bands:
+    each band keeps the edges that cross it (CSR layout) and a point is only ray
+    cast against the edges of its band
+    Attributes: \n
+        `polygon:` np.ndarray, (V, 2) lon, lat vertices \n
+        `bands:` int, number of latitude bands, about 4 edges per band by default \n
+    Methods: \n
+        `from_region():` index of map_coordinates/boundaries/{model_name}.txt \n
+        `contains():` bool mask of the points inside the boundary
+    """
+
+    def __init__(self, polygon: np.ndarray, bands: Optional[int] = None):
+        self.polygon = np.asarray(polygon, dtype=np.float64)
+        bands = bands or max(1, min(1024, len(self.polygon) // 4))
+        x1, y1 = self.polygon[:, 0], self.polygon[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        # horizontal edges are never crossed by the horizontal ray
+        keep = y1 != y2
+        self._ax, self._ay, self._by = x1[keep], y1[keep], y2[keep]
+        self._slope = (x2[keep] - x1[keep]) / (y2[keep] - y1[keep])
+
+        self.bands = bands
+        self.lat_min = float(y1.min())
+        self.band_height = max(float(y1.max()) - self.lat_min, 1e-12) / bands
+        low = self._band(np.minimum(self._ay, self._by))
+        high = self._band(np.maximum(self._ay, self._by))
+        # band -> edges crossing it: offsets into edge_ids
+        counts = high - low + 1
+        edges = np.repeat(np.arange(len(low)), counts)
+        band_of_edge = np.repeat(low, counts) + (
+            np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        )
+        order = np.argsort(band_of_edge, kind="stable")
+        self.edge_ids = edges[order]
+        self.offsets = np.zeros(bands + 1, dtype=np.int64)
+        np.cumsum(np.bincount(band_of_edge, minlength=bands), out=self.offsets[1:])
+
+    @classmethod
+    def from_region(
+        cls, model_name: str, bands: Optional[int] = None
+    ) -> "BoundaryIndex":
+        from .map_grid_generation import get_coordinates_from_file
+
+        return cls(np.array(get_coordinates_from_file(model_name)), bands)
+
+    def _band(self, lat: np.ndarray) -> np.ndarray:
+        band = np.floor((lat - self.lat_min) / self.band_height).astype(np.int64)
+        return np.clip(band, 0, self.bands - 1)
+
+    def contains(self, lon, lat) -> np.ndarray:
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        inside = np.zeros(lon.shape, dtype=bool)
+        lat_max = self.lat_min + self.bands * self.band_height
+        candidates = np.flatnonzero((lat >= self.lat_min) & (lat <= lat_max))
+        bands = self._band(lat[candidates])
+        for band in np.unique(bands):
+            points = candidates[bands == band]
+            edges = self.edge_ids[self.offsets[band] : self.offsets[band + 1]]
+            point_lon = lon[points, None]
+            point_lat = lat[points, None]
+            ay, by = self._ay[edges], self._by[edges]
+            crosses = (ay > point_lat) != (by > point_lat)
+            x_cross = self._ax[edges] + (point_lat - ay) * self._slope[edges]
+            inside[points] = (crosses & (point_lon < x_cross)).sum(axis=1) % 2 == 1
+        return inside
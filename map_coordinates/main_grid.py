@@ -1,18 +1,61 @@
-from files_map_logic.map_grid_generation import mesh_generation_file
-from files_map_logic.map_grid_reader import Mesh
+import argparse
+import sys
+
+# each mode imports only its own modules, gmsh is only loaded to generate a mesh
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Centroids of the search grid")
+    parser.add_argument(
+        "--batch",
+        nargs="*",
+        metavar="REGION",
+        help="headless mesh of the given regions (every boundary file if none) "
+        "in parallel worker processes, unchanged regions are skipped",
+    )
+    parser.add_argument("--workers", type=int, default=0, help="batch processes")
+    parser.add_argument("--force", action="store_true", help="rebuild every region")
+    args = parser.parse_args()
+
     # -- MODIFY THIS --
     model_name = "buenos_aires"
     size_element = 0.15
+    centroids_method = "mesh"  # "mesh": quad mesh centroids, "cover": circle cover
+    cover_radius = 11_000  # search radius in meters of the "cover" method
+    show_gui = False  # open the gmsh window once the mesh is generated
     # -----------------
 
-    mesh_generation_file(
-        model_name=model_name,
-        size_element=size_element,
-    )
+    if args.batch is not None:
+        from files_map_logic.batch_mesh import generate_meshes
+
+        statuses = generate_meshes(
+            size_element=size_element,
+            model_names=args.batch or None,
+            workers=args.workers,
+            force=args.force,
+        )
+        for name, status in sorted(statuses.items()):
+            print(f"{name}: {status}")
+        # build hosts check the exit code, a failed region fails the batch
+        if any(status.startswith("failed") for status in statuses.values()):
+            sys.exit(1)
+    elif centroids_method == "cover":
+        from files_map_logic.circle_cover import calculate_and_save_cover
+
+        stats = calculate_and_save_cover(model_name, radius=cover_radius)
+        print(
+            f"{stats['circles']} circles, coverage {stats['coverage']:.2%}, "
+            f"overlap {stats['mean_multiplicity']:.2f} circles per point, "
+            f"circle area / region area {stats['area_ratio']:.2f}"
+        )
+    else:
+        from files_map_logic.map_grid_generation import mesh_generation_file
+        from files_map_logic.map_grid_reader import Mesh
+
+        mesh_generation_file(
+            model_name=model_name,
+            size_element=size_element,
+            show_gui=show_gui,
+        )
 
-    mesh = Mesh()
-    mesh.read_gmsh_file(f"map_coordinates/msh_files/{model_name}.msh")
-    mesh.calculate_and_save_centroids(model_name)
+        Mesh.from_cache(model_name).calculate_and_save_centroids(model_name)
@@ -0,0 +1,147 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from crawler.crawl_engine import CrawlEngine
+from crawler.daily_quota import DailyQuota
+from crawler.details_cache import DetailsCache
+from crawler.http_session import PlacesSession
+from crawler.job_scheduler import CrawlJob, JobScheduler, load_manifest
+from crawler.metrics import metrics
+from crawler.places_api import (
+    DETAILS_URL,
+    NEARBY_SEARCH_URL,
+    set_details_cache,
+    set_rate_limit,
+    set_session,
+)
+from crawler.region_filter import RegionFilter
+from crawler.seen_set import make_seen_set
+from main import crawl_region, get_locations_from_centroids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs a manifest of (region, keyword, fields) sweeps"
+    )
+    parser.add_argument("manifest", help="JSON list of jobs, see README.md")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the jobs paused by the last run from their journals",
+    )
+    args = parser.parse_args()
+    api_key = os.getenv("API_KEY")
+
+    # ----- change if neccesary ----
+    max_jobs = 4  # jobs running at once, they share the pools below
+    max_workers = 16  # centroids searched at once, all jobs together
+    detail_workers = 32  # place details fetched at once, all jobs together
+    nearby_qps = 10.0  # 0 = no limit, all jobs together
+    details_qps = 50.0  # 0 = no limit, all jobs together
+    daily_requests = 100_000  # requests per day, all jobs together (0 = no limit)
+    quota_usage_path = "quota_usage.json"
+    details_per_centroid = 5.0  # detail lookups per centroid of the cost estimate
+    max_retries = 5
+    details_cache_path = "details_cache.sqlite"  # None = always fetch details
+    details_cache_ttl_days = 30
+    details_cache_max_entries = 500_000
+    dedup = "exact"  # "exact", "bloom" or None
+    bloom_capacity = 5_000_000
+    bloom_error_rate = 0.001
+    refine_max_depth = 2
+    refine_min_radius = 250.0
+    region_filter = None  # places outside the boundary: None (kept), "tag" or "drop"
+    metrics_path = None  # "run_metrics.json", or "run_metrics.prom" (Prometheus)
+    profile_path = None  # "crawl.prof": cProfile of the search, details and writes
+    # ------------------------------
+    try:
+        manifest = load_manifest(args.manifest)
+    except ValueError as error:
+        parser.error(str(error))
+    session = PlacesSession(
+        pool_size=max_workers + detail_workers, max_retries=max_retries
+    )
+    set_session(session)
+    if profile_path:
+        metrics.enable_profiling()
+    # the rate limits and the budget belong to the shared session, not to a job
+    set_rate_limit(NEARBY_SEARCH_URL, nearby_qps)
+    set_rate_limit(DETAILS_URL, details_qps)
+    quota = DailyQuota(quota_usage_path, daily_requests)
+    session.set_quota(quota)
+    details_cache = None
+    if details_cache_path:
+        details_cache = DetailsCache(
+            path=details_cache_path,
+            ttl=details_cache_ttl_days * 24 * 3600,
+            max_entries=details_cache_max_entries,
+        )
+        set_details_cache(details_cache)
+
+    with ThreadPoolExecutor(
+        max_workers, thread_name_prefix="nearby"
+    ) as nearby_pool, ThreadPoolExecutor(
+        detail_workers, thread_name_prefix="details"
+    ) as details_pool:
+
+        def run_job(job: CrawlJob) -> None:
+            engine = CrawlEngine(
+                api_key=api_key,
+                keyword=job.keyword,
+                extra_fields=job.extra_fields,
+                max_workers=max(1, max_workers // max_jobs),
+                nearby_qps=None,
+                details_qps=None,
+                seen=make_seen_set(
+                    dedup, capacity=bloom_capacity, error_rate=bloom_error_rate
+                ),
+                refine_max_depth=refine_max_depth,
+                refine_min_radius=refine_min_radius,
+                nearby_pool=nearby_pool,
+                details_pool=details_pool,
+                region=(
+                    RegionFilter.from_region(job.region, region_filter)
+                    if region_filter
+                    else None
+                ),
+            )
+            crawl_region(
+                engine,
+                get_locations_from_centroids(job.region),
+                filename=f"values_found_{job.name}.csv",
+                run_info={
+                    "state": job.region,
+                    "query": job.keyword,
+                    "extra_fields": job.extra_fields,
+                    "region_filter": region_filter,
+                },
+                resume=args.resume,
+                label=job.name,
+            )
+
+        scheduler = JobScheduler(
+            run_job,
+            quota=quota,
+            max_jobs=max_jobs,
+            details_per_centroid=details_per_centroid,
+        )
+        jobs = scheduler.plan(manifest)
+        print(f"Budget left today: {quota.remaining()} requests")
+        for job in jobs:
+            print(
+                f"  {job.name}: {job.centroids} centroids, "
+                f"~{job.estimated_requests(details_per_centroid):.0f} requests"
+            )
+        statuses = scheduler.run(jobs)
+
+    for name, status in statuses.items():
+        print(f"{name}: {status}")
+    print(f"Requests spent today: {quota.used}")
+    if details_cache is not None:
+        print(f"Details cache: {details_cache.stats()}")
+        details_cache.close()
+    session.close()
+    if metrics_path:
+        metrics.save(metrics_path)
+    if profile_path:
+        metrics.save_profile(profile_path)